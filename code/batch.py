@@ -0,0 +1,284 @@
+#
+# ConnectZ batch evaluation
+#
+# Scores many games of the same board size at once by stacking them into a single NumPy array of shape
+# (games, height, width). Row 0 is the bottom of the board and cells hold 0 (empty), 1 or 2 (player coins).
+#
+# `evaluate_boards` finds `n` in a row on finished boards by repeatedly ANDing each player's coin mask with a shifted
+# copy of itself, doubling the run length tested on each pass.
+#
+# `replay_games` drops the coins of every game in lock step, one move index at a time, recording the move that ended
+# each game so moves made after a win or draw still raise code 4.
+#
+# `estimate_outcomes` plays random games on from a position in batches, every game in a batch moving at once, to
+# estimate each player's chance of winning.
+#
+
+
+import math
+import time
+
+import numpy as np
+
+from connectz import Game
+
+# Row and column step to the neighbouring cell for horizontal, vertical, inclining and declining lines
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (-1, 1))
+
+
+def _shifted(cells, row_step, column_step):
+    """
+    Shift a stack of boards so each cell holds its neighbour `row_step` rows up and `column_step` columns across.
+    Cells shifted in from off the board are empty.
+    :type cells: numpy.ndarray
+    :type row_step: int
+    :type column_step: int
+    :rtype: numpy.ndarray
+    """
+    height, width = cells.shape[1:]
+    shifted = np.zeros_like(cells)
+    if abs(row_step) >= height or abs(column_step) >= width:
+        return shifted  # Neighbour is always off the board
+    shifted[:, max(-row_step, 0):height - max(row_step, 0), max(-column_step, 0):width - max(column_step, 0)] = \
+        cells[:, max(row_step, 0):height - max(-row_step, 0), max(column_step, 0):width - max(-column_step, 0)]
+    return shifted
+
+
+def _has_run(coins, counters):
+    """
+    Check each board in the stack for `n` in a row of set cells in any direction.
+    :param coins: bool array of shape (games, height, width)
+    :param counters: Connect `n`
+    :rtype: numpy.ndarray
+    """
+    found = np.zeros(coins.shape[0], dtype=bool)
+    if counters < 0:
+        return found  # No count of coins matches a negative `n`, as on `Game`
+    for row_step, column_step in DIRECTIONS:
+        runs = coins  # Cells that start a run of `length` coins
+        length = 1
+        while length * 2 <= counters:
+            runs = runs & _shifted(runs, row_step * length, column_step * length)
+            length *= 2
+        if length < counters:
+            runs = runs & _shifted(runs, row_step * (counters - length), column_step * (counters - length))
+        found |= runs.any(axis=(1, 2))
+    return found
+
+
+def evaluate_boards(boards, counters):
+    """
+    Return the outcome of every finished board in the stack, using the same codes as `Game.get_outcome`.
+    Boards are assumed to come from legal games, so at most one player has `n` in a row. Player 1 is reported should
+    both.
+    :param boards: int array of shape (games, height, width)
+    :param counters: Connect `n`
+    :rtype: numpy.ndarray
+    """
+    boards = np.asarray(boards)
+    height, width = boards.shape[1:]
+    outcomes = np.full(boards.shape[0], 3, dtype=np.int8)  # Incomplete unless shown otherwise
+    if width >= counters and height >= counters:
+        # Same draw rule as `Game._check_draw`
+        outcomes[(boards != 0).all(axis=(1, 2))] = 0
+    outcomes[_has_run(boards == 2, counters)] = 2
+    outcomes[_has_run(boards == 1, counters)] = 1
+    return outcomes
+
+
+def _check_placed(boards, games, rows, columns, players, counters):
+    """
+    Check the four lines through the coins just placed in each of the argument games for `n` in a row.
+    :rtype: numpy.ndarray
+    """
+    height, width = boards.shape[1:]
+    won = np.zeros(games.shape[0], dtype=bool)
+    if counters < 0:
+        return won  # No count of coins matches a negative `n`, as on `Game`
+    for row_step, column_step in DIRECTIONS:
+        runs = np.ones(games.shape[0], dtype=np.int64)  # The coins just placed
+        for direction in (1, -1):
+            # Walk away from the coins in both directions along this line
+            alive = np.ones(games.shape[0], dtype=bool)
+            for count in range(1, counters):
+                row = rows + row_step * direction * count
+                column = columns + column_step * direction * count
+                on_board = (row >= 0) & (row < height) & (column >= 0) & (column < width)
+                alive &= on_board
+                alive &= boards[games, row.clip(0, height - 1), column.clip(0, width - 1)] == players
+                if not alive.any():
+                    break  # Every line broken
+                runs += alive
+        won |= runs >= counters
+    return won
+
+
+def replay_games(conf, games):
+    """
+    Replay move sequences for many games of the same configuration at once, players alternating from player 1.
+    Returns the outcome or error code of each game (0 to 6), the move number that ended or broke each game (0 while
+    still in play) and the stacked boards.
+    :param conf: Game configuration, validated by `Game`
+    :param games: Sequence of column number sequences
+    :return: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    :exception: GameException
+    """
+    obj_game = Game(conf)
+    width, height, counters = obj_game._board_width, obj_game._board_height, obj_game._counters
+    game_count = len(games)
+    lengths = np.array([len(moves) for moves in games], dtype=np.int64)
+    moves = np.zeros((game_count, lengths.max() if game_count else 0), dtype=np.int64)
+    for game_idx, game_moves in enumerate(games):
+        moves[game_idx, :len(game_moves)] = game_moves
+
+    boards = np.zeros((game_count, max(height, 0), max(width, 0)), dtype=np.int8)
+    heights = np.zeros((game_count, max(width, 0)), dtype=np.int64)
+    outcomes = np.full(game_count, 3, dtype=np.int8)
+    end_moves = np.zeros(game_count, dtype=np.int64)
+    broken = np.zeros(game_count, dtype=bool)  # Game raised an error code
+    for move_idx in range(moves.shape[1]):
+        move_number = move_idx + 1
+        player = move_idx % 2 + 1
+        playing = (lengths > move_idx) & ~broken
+        columns = moves[:, move_idx]
+        # Errors in the same order as `Game._check_move` then `Game.move`
+        illegal_column = playing & ((columns < 1) | (columns > width))
+        finished = playing & ~illegal_column & (end_moves > 0)
+        placing = playing & ~illegal_column & ~finished
+        games_idx = np.flatnonzero(placing)
+        column_idx = columns[games_idx] - 1
+        rows = heights[games_idx, column_idx]
+        full = rows >= height
+        illegal_row = np.zeros(game_count, dtype=bool)
+        illegal_row[games_idx[full]] = True
+        for code, errors in ((6, illegal_column), (4, finished), (5, illegal_row)):
+            outcomes[errors] = code
+            end_moves[errors] = move_number
+            broken |= errors
+        # Drop the coins
+        games_idx, column_idx, rows = games_idx[~full], column_idx[~full], rows[~full]
+        boards[games_idx, rows, column_idx] = player
+        heights[games_idx, column_idx] += 1
+        if move_number < 2 * counters - 1:
+            continue  # No point running check unless minimum moves reached
+        won = _check_placed(boards, games_idx, rows, column_idx, player, counters)
+        outcomes[games_idx[won]] = player
+        end_moves[games_idx[won]] = move_number
+        if move_number == width * height and width >= counters and height >= counters:
+            # Same draw rule as `Game._check_draw`
+            drawn = games_idx[~won]
+            outcomes[drawn] = 0
+            end_moves[drawn] = move_number
+    return outcomes, end_moves, boards
+
+
+class OutcomeEstimate(object):
+    """Outcome frequencies from random playouts"""
+
+    def __init__(self, counts, z, seconds):
+        """
+        :param counts: Playouts ending in a draw, a player 1 win and a player 2 win, in that order. A full board with
+            no winner counts as a draw.
+        :param z: Normal quantile for the confidence intervals, e.g. 1.96 for 95%
+        :param seconds: Time taken
+        """
+        self.counts = counts
+        self.playouts = sum(counts)
+        self.seconds = seconds
+        self.frequencies = [count / self.playouts for count in counts]
+        self.intervals = [_wilson(count, self.playouts, z) for count in counts]
+
+    @classmethod
+    def decided(cls, outcome, seconds):
+        """
+        Certain estimate for a game that is already over.
+        :param outcome: 0 for a draw, else the winning player
+        :param seconds: Time taken
+        :rtype: OutcomeEstimate
+        """
+        obj_estimate = cls([int(result == outcome) for result in range(3)], 0.0, seconds)
+        obj_estimate.counts = [0, 0, 0]
+        obj_estimate.playouts = 0
+        return obj_estimate
+
+    @property
+    def playouts_per_second(self):
+        return self.playouts / self.seconds if self.seconds else 0.0
+
+
+def _wilson(count, total, z):
+    """
+    Wilson score interval for a proportion.
+    :return: (float, float)
+    """
+    p = count / total
+    centre = (p + z * z / (2 * total)) / (1 + z * z / total)
+    spread = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / (1 + z * z / total)
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+def _playout_batch(board, heights, move_count, counters, size, obj_random):
+    """
+    Play `size` random games on from the argument position, every game moving at once.
+    :param board: int8 array (height, width) of the position
+    :param heights: int array (width) of column heights
+    :param move_count: Moves made to reach the position
+    :param counters: Connect `n`
+    :type obj_random: numpy.random.RandomState
+    :return: int array (size) of outcomes, 0 when nobody wins before the board fills
+    """
+    height, width = board.shape
+    boards = np.repeat(board[np.newaxis], size, axis=0)
+    column_heights = np.repeat(heights[np.newaxis], size, axis=0)
+    outcomes = np.zeros(size, dtype=np.int8)
+    games_idx = np.arange(size)
+    for move_number in range(move_count + 1, width * height + 1):
+        if not games_idx.size:
+            break
+        player = 2 - move_number % 2
+        # Uniform choice among each game's open columns: the open column with the biggest random key
+        keys = obj_random.random_sample((games_idx.size, width))
+        keys[column_heights[games_idx] >= height] = -1.0
+        column_idx = keys.argmax(axis=1)
+        rows = column_heights[games_idx, column_idx]
+        boards[games_idx, rows, column_idx] = player
+        column_heights[games_idx, column_idx] += 1
+        if move_number < 2 * counters - 1:
+            continue  # No point running check unless minimum moves reached
+        won = _check_placed(boards, games_idx, rows, column_idx, player, counters)
+        outcomes[games_idx[won]] = player
+        games_idx = games_idx[~won]
+    return outcomes
+
+
+def estimate_outcomes(obj_game, playouts=10000, seconds=None, batch_size=2000, seed=None, z=1.96):
+    """
+    Estimate how often each player wins from the argument game's position by random playouts, players alternating
+    from whoever is to move. Batches are played until `playouts` have been played or `seconds` have passed, whichever
+    comes first, with at least one batch.
+    :param obj_game: `Game` or `BitboardGame`, left unchanged
+    :param playouts: Most playouts to play
+    :param seconds: Time budget, None for no limit
+    :param batch_size: Playouts played at once
+    :param seed: Random seed, the same seed and playouts always give the same estimate
+    :param z: Normal quantile for the confidence intervals, 1.96 for 95%
+    :rtype: OutcomeEstimate
+    """
+    started = time.perf_counter()
+    width, height, counters = obj_game._board_width, obj_game._board_height, obj_game._counters
+    outcome = obj_game.get_outcome()
+    if outcome in (0, 1, 2):
+        return OutcomeEstimate.decided(outcome, time.perf_counter() - started)
+    board = np.zeros((height, width), dtype=np.int8)
+    for (row_idx, column_idx), player in obj_game._placed():
+        board[row_idx, column_idx] = player
+    heights = (board != 0).sum(axis=0)
+    obj_random = np.random.RandomState(seed)
+    counts = np.zeros(3, dtype=np.int64)
+    while counts.sum() < playouts:
+        size = int(min(batch_size, playouts - counts.sum()))
+        counts += np.bincount(_playout_batch(board, heights, obj_game._move_count, counters, size, obj_random),
+                              minlength=3)
+        if seconds is not None and time.perf_counter() - started >= seconds:
+            break
+    return OutcomeEstimate([int(count) for count in counts], z, time.perf_counter() - started)
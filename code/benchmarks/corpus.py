@@ -0,0 +1,278 @@
+#
+# Self-play corpus generator
+#
+# Writes large corpora of game files with a chosen mix of outcomes and error codes, for load testing and as a
+# differential test set. Each game is played out by self-play, then cut or spoilt to give the outcome drawn from the
+# mix. Random self-play runs on the generator's `Board`, which tracks column heights and checks only the lines through
+# each coin dropped. Weighted self-play runs on a `Game` with a threat map, which gives the winning and blocking
+# columns after every move.
+#
+#   0 / 1 / 2 -- a game played to that end, 3 -- a game cut short, 4 -- one move after the end
+#   5 -- a move into a full column, 6 -- a column off the board, 7 -- a board that can't hold a win
+#   8 -- a line that isn't a move, a bad config or an empty file, 9 -- a file listed but never written
+#
+# When self-play doesn't reach the outcome within a few games, `generate_game` builds one that does.
+#
+# Games are generated in shards, each from its own seed, spread over a process pool, so the corpus depends only on the
+# seed and never on the number of workers. A shard is a directory of `.txt` files, or with `--archive` a gzipped tar
+# of them. `expected.tsv` lists each game as `path<TAB>code`, the same as `connectz.py --batch` prints, with paths
+# relative to the output directory.
+#
+# Usage, from the directory holding connectz.py:
+#   python -m benchmarks.corpus OUTPUT [--games N] [--seed S] [--config "W H Z"] [--mix CODE=WEIGHT,...]
+#                                      [--policy random|weighted] [--archive] [--workers N] [--shard-size N]
+#
+
+
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import sys
+import tarfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from benchmarks.generator import Board
+from benchmarks.generator import GenerationError
+from benchmarks.generator import generate_game
+from connectz import Game
+
+# Outcome or error code and its share of the games
+DEFAULT_MIX = ((0, 2), (1, 30), (2, 30), (3, 20), (4, 3), (5, 3), (6, 3), (7, 3), (8, 3), (9, 3))
+
+BAD_LINES = ('x', '', '1.5')
+MANIFEST = 'expected.tsv'
+
+
+def self_play(obj_random, width, height, counters, policy='random'):
+    """
+    Play a game to its end, players alternating from player 1.
+    `random` picks any open column on a `Board`. `weighted` plays on a `Game` with a threat map, taking a winning
+    column, else blocking one of the other player's, else picking a column weighted towards the centre.
+    :type obj_random: random.Random
+    :return: (list(int), int) the columns played and the outcome, 0 to 3
+    """
+    if policy == 'weighted':
+        return _weighted_play(obj_random, width, height, counters)
+    board = Board(width, height, counters)
+    player = 1
+    while board.open_columns:
+        column = obj_random.choice(board.open_columns)
+        b_won = board.wins(column, player)
+        board.drop(column, player)
+        if b_won:
+            return board.moves, player
+        player = 3 - player
+    # A full board is only a draw when a win fitted on it
+    return board.moves, 0 if width >= counters and height >= counters else 3
+
+
+def _weighted_play(obj_random, width, height, counters):
+    """
+    Weighted self-play, see `self_play`.
+    :rtype: (list(int), int)
+    """
+    obj_game = Game('{} {} {}'.format(width, height, counters), threats=True)
+    weights = [min(column, width + 1 - column) for column in range(1, width + 1)]
+    moves = []
+    player = 1
+    while obj_game.get_outcome() == 3 and len(moves) < width * height:
+        columns = obj_game.winning_columns(player) or obj_game.winning_columns(3 - player)
+        if columns:
+            column = obj_random.choice(columns)
+        else:
+            open_columns = [column for column in range(1, width + 1) if obj_game._column_heights[column - 1] < height]
+            column = obj_random.choices(open_columns, [weights[column - 1] for column in open_columns])[0]
+        obj_game._drop(column, player)
+        moves.append(column)
+        player = 3 - player
+    return moves, obj_game.get_outcome()
+
+
+def _full_column_move(obj_random, moves, height, in_play):
+    """
+    Cut the moves where a column is full and the game still in play, and add a move into a full column.
+    :param moves: Columns of a game played to its end
+    :param in_play: Moves after which the game is still in play
+    :return: list(int), None when no column fills in time
+    """
+    heights = {}
+    first_full = None
+    for move_idx, column in enumerate(moves[:in_play]):
+        heights[column] = heights.get(column, 0) + 1
+        if heights[column] == height:
+            first_full = move_idx + 1
+            break
+    if first_full is None:
+        return None
+    columns = moves[:obj_random.randint(first_full, in_play)]
+    heights = {}
+    for column in columns:
+        heights[column] = heights.get(column, 0) + 1
+    return columns + [obj_random.choice([column for column, count in heights.items() if count == height])]
+
+
+def corpus_game(obj_random, width, height, counters, outcome, policy='random', attempts=10):
+    """
+    Generate a game file with the argument outcome from self-play.
+    :type obj_random: random.Random
+    :param outcome: Code the game should produce, see module comment
+    :param policy: `random` or `weighted`, see `self_play`
+    :param attempts: Games to play before building the outcome with `generate_game`
+    :return: (list(str), int) lines of the game file, None for a file that shouldn't exist, and the expected code
+    :exception: GenerationError
+    """
+    config = '{} {} {}'.format(width, height, counters)
+    if outcome == 9:
+        return None, 9
+    if outcome == 7:
+        # Win longer than either side, with a few moves to be ignored
+        lines = ['{} {} {}'.format(width, height, max(width, height) + 1)]
+        return lines + [str(obj_random.randint(1, width)) for _ in range(obj_random.randint(0, 3))], 7
+    if outcome == 8 and obj_random.random() < 0.2:
+        return obj_random.choice([[], ['{} x {}'.format(width, counters)]]), 8
+    for _ in range(attempts):
+        moves, ended = self_play(obj_random, width, height, counters, policy)
+        in_play = len(moves) - (ended != 3)  # Moves after which the game is still in play
+        columns = None
+        if outcome in (0, 1, 2) and ended == outcome:
+            columns = moves
+        elif outcome == 3:
+            columns = moves[:obj_random.randint(0, in_play)]
+        elif outcome == 4 and ended != 3:
+            columns = moves + [obj_random.randint(1, width)]
+        elif outcome == 5:
+            columns = _full_column_move(obj_random, moves, height, in_play)
+        elif outcome == 6:
+            columns = moves[:obj_random.randint(0, len(moves))] + [
+                obj_random.choice([0, -obj_random.randint(1, 9), width + obj_random.randint(1, 9)])]
+        elif outcome == 8:
+            columns = moves[:obj_random.randint(0, len(moves))] + [obj_random.choice(BAD_LINES)]
+        if columns is not None:
+            return [config] + [str(column) for column in columns], outcome
+    return generate_game(obj_random.getrandbits(32), width, height, counters, outcome)
+
+
+def generate_shard(task):
+    """
+    Generate and write one shard of games, run in a worker process.
+    :param task: (shard, first game, games, seed, configs, mix, policy, output directory, b_archive)
+    :return: list((str, int)) path relative to the output directory and expected code of each game
+    """
+    shard, first, games, seed, configs, mix, policy, output, b_archive = task
+    obj_random = random.Random('{}-{}'.format(seed, shard))
+    codes, weights = zip(*mix)
+    directory = '{:05d}'.format(shard)
+    if b_archive:
+        archive = tarfile.open(os.path.join(output, directory + '.tar.gz'), 'w:gz', compresslevel=6)
+    else:
+        os.makedirs(os.path.join(output, directory), exist_ok=True)
+    results = []
+    try:
+        for game_idx in range(first, first + games):
+            outcome = obj_random.choices(codes, weights)[0]
+            for _ in range(len(configs) * 4):
+                width, height, counters = obj_random.choice(configs)
+                try:
+                    lines, expected = corpus_game(obj_random, width, height, counters, outcome, policy)
+                    break
+                except GenerationError:
+                    continue  # e.g. no draw on this board, try another
+            else:
+                raise GenerationError('No configuration gives outcome {}'.format(outcome))
+            path = '{}/game_{:09d}.txt'.format(directory, game_idx)
+            results.append((path, expected))
+            if lines is None:
+                continue  # Listed, never written
+            data = ('\n'.join(lines) + '\n' if lines else '').encode()
+            if b_archive:
+                info = tarfile.TarInfo(path)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+            else:
+                with open(os.path.join(output, path), 'wb') as f:
+                    f.write(data)
+    finally:
+        if b_archive:
+            archive.close()
+    return results
+
+
+def generate_corpus(output, games, seed=0, configs=((7, 6, 4),), mix=DEFAULT_MIX, policy='random', b_archive=False,
+                    workers=None, shard_size=1000):
+    """
+    Generate a corpus of game files and its manifest of expected codes.
+    :param output: Directory to write to, created if missing
+    :param games: Games to generate
+    :param seed: Random seed, the same arguments always give the same corpus whatever the worker count
+    :param configs: (width, height, counters) boards to pick from
+    :param mix: (code, weight) share of each outcome or error code
+    :param policy: `random` or `weighted`, see `self_play`
+    :param b_archive: Write each shard as a gzipped tar rather than a directory
+    :param workers: Process count, defaults to the CPU count. One runs in this process.
+    :param shard_size: Games per shard
+    :return: (int, float) games written and seconds taken
+    """
+    started = time.perf_counter()
+    os.makedirs(output, exist_ok=True)
+    tasks = [(shard, first, min(shard_size, games - first), seed, tuple(configs), tuple(mix), policy, output,
+              b_archive) for shard, first in enumerate(range(0, games, shard_size))]
+    if workers == 1:
+        pool = None
+        shards = map(generate_shard, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        shards = pool.imap(generate_shard, tasks)
+    count = 0
+    try:
+        with open(os.path.join(output, MANIFEST), 'w') as f:
+            for results in shards:
+                for path, code in results:
+                    f.write('{}\t{}\n'.format(path, code))
+                count += len(results)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return count, time.perf_counter() - started
+
+
+def _parse_mix(text):
+    """
+    Parse `CODE=WEIGHT,...`.
+    :rtype: tuple((int, float))
+    """
+    mix = []
+    for item in text.split(','):
+        code, weight = item.split('=')
+        if int(code) not in range(10):
+            raise argparse.ArgumentTypeError('Unknown code {}'.format(code))
+        mix.append((int(code), float(weight)))
+    return tuple(mix)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Generate a corpus of ConnectZ game files by self-play.')
+    parser.add_argument('output', help='directory to write to')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--config', action='append', metavar='"W H Z"',
+                        help='board to pick from, may be repeated (default "7 6 4")')
+    parser.add_argument('--mix', type=_parse_mix, default=DEFAULT_MIX, metavar='CODE=WEIGHT,...',
+                        help='share of each outcome or error code')
+    parser.add_argument('--policy', choices=['random', 'weighted'], default='random')
+    parser.add_argument('--archive', action='store_true', help='write each shard as a gzipped tar')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default CPU count)')
+    parser.add_argument('--shard-size', type=int, default=1000, help='games per shard (default 1000)')
+    args = parser.parse_args(argv)
+
+    configs = [tuple(int(value) for value in config.split()) for config in args.config or ['7 6 4']]
+    count, seconds = generate_corpus(args.output, args.games, args.seed, configs, args.mix, args.policy,
+                                     args.archive, args.workers, args.shard_size)
+    print('{} games in {:.2f}s, {:.0f} games/s'.format(count, seconds, count / seconds), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
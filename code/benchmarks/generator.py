@@ -0,0 +1,236 @@
+#
+# Seeded synthetic game generator
+#
+# Builds game files for any board size with a chosen outcome. Moves are random, but a move that would complete `n` in
+# a row is avoided until the game is long enough, so wins can be pushed late into the game.
+#
+# Random play rarely fills a big board without a win, so draws are built from a colouring of the board in pairs of
+# cells, which never lines up more than two coins of a colour, then played in a random order gravity allows.
+#
+# Outcomes are the codes returned or raised by `ConnectZ.run_game`:
+#   0 -- draw, 1 / 2 -- player win, 3 -- incomplete
+#   4 -- illegal continue, 5 -- illegal row, 6 -- illegal column, 7 -- illegal game, 8 -- invalid file
+#
+
+
+import heapq
+import random
+
+
+class GenerationError(Exception):
+    """Random play could not reach the requested outcome"""
+    pass
+
+
+class Board(object):
+    """Column heights and coins of a game in progress, enough to tell whether a move wins"""
+
+    def __init__(self, width, height, counters):
+        self.width = width
+        self.height = height
+        self.counters = counters
+        self.heights = {}
+        self.cells = {}
+        self.moves = []
+        # Columns, numbered from 1, that still have room for a coin, and where each sits in that list
+        self.open_columns = list(range(1, width + 1)) if height > 0 else []
+        self._open_idx = {column: idx for idx, column in enumerate(self.open_columns)}
+
+    def wins(self, column, player):
+        """
+        Check whether dropping a coin for the argument player into the column would give `n` in a row.
+        :type column: int
+        :type player: int
+        :rtype: bool
+        """
+        row = self.heights.get(column, 0)
+        for row_step, column_step in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+            run = 1
+            for direction in (1, -1):
+                next_row = row + row_step * direction
+                next_column = column + column_step * direction
+                while run < self.counters and self.cells.get((next_row, next_column)) == player:
+                    run += 1
+                    next_row += row_step * direction
+                    next_column += column_step * direction
+            if run >= self.counters:
+                return True
+        return False
+
+    def safe_column(self, obj_random, player, exclude=None):
+        """
+        Pick a random open column that doesn't win for the argument player, None when every column wins.
+        :type obj_random: random.Random
+        :type player: int
+        :param exclude: Column not to pick
+        :rtype: int
+        """
+        for _ in range(8):
+            column = obj_random.choice(self.open_columns)
+            if column != exclude and not self.wins(column, player):
+                return column
+        columns = list(self.open_columns)
+        obj_random.shuffle(columns)
+        for column in columns:
+            if column != exclude and not self.wins(column, player):
+                return column
+        return None
+
+    def drop(self, column, player):
+        """
+        Drop a coin for the argument player into the column.
+        :type column: int
+        :type player: int
+        """
+        row = self.heights.get(column, 0)
+        self.cells[(row, column)] = player
+        self.heights[column] = row + 1
+        self.moves.append(column)
+        if row + 1 == self.height:
+            # Column full, swap it out of the open list
+            idx = self._open_idx.pop(column)
+            last = self.open_columns.pop()
+            if last != column:
+                self.open_columns[idx] = last
+                self._open_idx[last] = idx
+
+
+def play(obj_random, width, height, counters, moves, winner=None):
+    """
+    Play `moves` random moves without anybody winning, then, when there is to be a `winner`, carry on until they win.
+    To make sure they get there the winner stacks a column with room for `n` coins while the other player keeps out
+    of it, but any other win the winner stumbles on is taken first.
+    :type obj_random: random.Random
+    :return: Board
+    :exception: GenerationError
+    """
+    board = Board(width, height, counters)
+    player = 1
+    target = None  # Column the winner is stacking
+    while board.open_columns and (winner or len(board.moves) < moves):
+        b_finishing = winner and len(board.moves) >= moves
+        column = obj_random.choice(board.open_columns)
+        if b_finishing:
+            if target is None:
+                room = [column for column in board.open_columns if height - board.heights.get(column, 0) >= counters]
+                target = obj_random.choice(room) if room else 0
+            if player == winner and target and board.heights.get(target, 0) < height:
+                column = target
+            elif player != winner and column == target:
+                column = board.safe_column(obj_random, player, exclude=target) or column
+        if board.wins(column, player):
+            if b_finishing and player == winner:
+                board.drop(column, player)
+                return board
+            column = board.safe_column(obj_random, player, exclude=target)  # Look for another move
+            if column is None:
+                raise GenerationError('Every move wins after {} moves'.format(len(board.moves)))
+        board.drop(column, player)
+        player = 2 if player == 1 else 1
+    if winner:
+        raise GenerationError('Board filled without a win')
+    return board
+
+
+# Board colourings for a draw, player 1 on 0. Between them one can always be played with players alternating.
+DRAW_PATTERNS = (
+    lambda row, column: (row // 2 + column) % 2,
+    lambda row, column: (column // 2 + row) % 2,
+    lambda row, column: (row // 2 + column + 1) % 2,
+    lambda row, column: (column // 2 + row + 1) % 2,
+)
+
+
+def draw_moves(obj_random, width, height):
+    """
+    Fill the board without any player getting more than two in a row.
+    :type obj_random: random.Random
+    :return: list(int)
+    :exception: GenerationError
+    """
+    for pattern in DRAW_PATTERNS:
+        # Columns waiting on each player, keyed by the row of their next cell, lowest first so no colour gets stranded
+        waiting = ([], [])
+        for column in range(width):
+            heapq.heappush(waiting[pattern(0, column)], (0, obj_random.random(), column))
+        moves = []
+        player = 0
+        for _ in range(width * height):
+            if not waiting[player]:
+                break
+            row, _, column = heapq.heappop(waiting[player])
+            moves.append(column + 1)
+            if row + 1 < height:
+                heapq.heappush(waiting[pattern(row + 1, column)], (row + 1, obj_random.random(), column))
+            player = 1 - player
+        else:
+            return moves
+    raise GenerationError('No drawn filling of a {}x{} board'.format(width, height))
+
+
+def generate_game(seed, width, height, counters, outcome, moves=None, attempts=20):
+    """
+    Generate a game file with the argument outcome.
+    :param seed: Random seed, the same arguments always give the same game
+    :param width: Board width
+    :param height: Board height
+    :param counters: Connect `n`
+    :param outcome: Code the game should produce, see module comment
+    :param moves: Moves to play before the game may be won or is cut short. Defaults to half the board.
+    :param attempts: Seeds to try before giving up on an outcome random play struggles to reach
+    :return: (list(str), int) lines of the game file and the expected code
+    :exception: GenerationError
+    """
+    config = '{} {} {}'.format(width, height, counters)
+    if outcome == 7:
+        # Neither dimension can hold a win
+        return ['{} {} {}'.format(counters - 1, counters - 1, counters)], 7
+    if moves is None:
+        moves = width * height // 2
+    moves = min(moves, width * height - 1)  # A full board would be a draw
+    if outcome == 0:
+        if width < counters or height < counters or counters < 3:
+            raise GenerationError('A full {} board is not a draw'.format(config))
+        return [config] + [str(column) for column in draw_moves(random.Random(seed), width, height)], 0
+    last_error = None
+    for attempt in range(attempts):
+        obj_random = random.Random('{}-{}'.format(seed, attempt))
+        try:
+            board = play(obj_random, width, height, counters, moves, {1: 1, 2: 2, 4: 1}.get(outcome))
+        except GenerationError as e:
+            last_error = e
+            continue
+        columns = [str(column) for column in board.moves]
+        if outcome == 4:
+            columns.append(str(obj_random.choice(range(1, width + 1))))
+        elif outcome == 5:
+            full = [column for column in range(1, width + 1) if board.heights.get(column, 0) == height]
+            if not full:
+                # Fill a column, avoiding wins, then drop one more coin into it
+                column = obj_random.choice(board.open_columns)
+                player = 1 if len(board.moves) % 2 == 0 else 2
+                while board.heights.get(column, 0) < height and not board.wins(column, player):
+                    board.drop(column, player)
+                    player = 2 if player == 1 else 1
+                if board.heights.get(column, 0) < height or len(board.moves) == width * height:
+                    continue  # Would have been a win or a draw
+                columns = [str(column) for column in board.moves]
+                full = [column]
+            columns.append(str(obj_random.choice(full)))
+        elif outcome == 6:
+            columns.append(str(width + obj_random.randint(1, 9)))
+        elif outcome == 8:
+            columns.append(obj_random.choice(['x', '', '1.5']))
+        return [config] + columns, outcome
+    raise GenerationError('No game with outcome {} for {} after {} attempts ({})'.format(
+        outcome, config, attempts, last_error))
+
+
+def write_game(path, lines):
+    """
+    Write game file lines in the format read by `ConnectZ`.
+    :type path: str
+    :type lines: list(str)
+    """
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,74 @@
+#
+# Memory held per live game
+#
+# Creates many games of each scenario on each backend, plays the same generated moves into every one of them, and
+# reports the traced memory they hold between them divided by the number of games.
+#
+# Usage, from the directory holding connectz.py:
+#   python -m benchmarks.memory [--backend NAME] [--scenario NAME]
+#
+
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from connectz import GAME_BACKENDS
+from connectz import new_game
+from benchmarks.generator import generate_game
+
+# Name, width, height, counters, moves played into each game and games held at once
+SCENARIOS = [
+    ('classic', 7, 6, 4, 20, 10000),
+    ('large', 200, 200, 6, 2000, 50),
+]
+
+
+def bytes_per_game(conf, columns, backend, games):
+    """
+    Memory held by each of the argument number of games once the columns have been played into them.
+    :param conf: Game configuration
+    :param columns: Columns to play, players alternating
+    :param backend: Game engine, one of `GAME_BACKENDS`
+    :param games: Games to hold at once
+    :rtype: float
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = []
+    for _ in range(games):
+        obj_game = new_game(conf, backend=backend)
+        obj_game.play_columns(columns)
+        held.append(obj_game)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / games
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure memory held per live ConnectZ game.')
+    parser.add_argument('--backend', action='append', choices=sorted(GAME_BACKENDS),
+                        help='only measure the named backend, may be repeated')
+    parser.add_argument('--scenario', action='append', help='only run the named scenario, may be repeated')
+    args = parser.parse_args(argv)
+
+    backends = args.backend or sorted(GAME_BACKENDS)
+    print('{:<10} {:<12} {:>8} {:>16}'.format('scenario', 'board', 'moves', ' '.join(
+        '{:>12}'.format(backend) for backend in backends)))
+    for name, width, height, counters, moves, games in SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        lines, _ = generate_game(name, width, height, counters, 3, moves)
+        columns = [int(line) for line in lines[1:]]
+        sizes = [bytes_per_game(lines[0], columns, backend, games) for backend in backends]
+        print('{:<10} {:<12} {:>8} {:>16}'.format(name, 'x'.join(lines[0].split()), len(columns), ' '.join(
+            '{:>12.0f}'.format(size) for size in sizes)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,57 @@
+#
+# Monte Carlo estimator benchmark
+#
+# Estimates the outcome odds of positions part way through seeded generated games with `estimate_outcomes`, reporting
+# the odds, the widest confidence interval and playouts per second at a few batch sizes.
+#
+# Usage, from the directory holding connectz.py:
+#   python -m benchmarks.montecarlo [--scenario NAME] [--playouts N] [--seconds S]
+#
+
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from batch import estimate_outcomes
+from benchmarks.generator import generate_game
+from connectz import Game
+
+# Name, width, height, counters and moves played before estimating
+SCENARIOS = [
+    ('classic', 7, 6, 4, 6),
+    ('wide', 19, 12, 5, 20),
+]
+
+BATCH_SIZES = (250, 2000, 8000)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the ConnectZ Monte Carlo estimator.')
+    parser.add_argument('--scenario', action='append', help='only run the named scenario, may be repeated')
+    parser.add_argument('--playouts', type=int, default=20000, help='playouts per estimate')
+    parser.add_argument('--seconds', type=float, help='time budget per estimate')
+    args = parser.parse_args(argv)
+
+    print('{:<8} {:>6} {:>6} {:>6} {:>6} {:>7} {:>8} {:>8} {:>11}'.format(
+        'scenario', 'batch', 'draw', 'p1', 'p2', '±', 'playouts', 'seconds', 'playouts/s'))
+    for name, width, height, counters, moves in SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        lines, _ = generate_game(1, width, height, counters, 3, moves + 1)
+        obj_game = Game(lines[0])
+        for move_idx, column in enumerate(lines[1:moves + 1]):
+            obj_game.move(int(column), move_idx % 2 + 1)
+        for batch_size in BATCH_SIZES:
+            obj_estimate = estimate_outcomes(obj_game, playouts=args.playouts, seconds=args.seconds,
+                                             batch_size=batch_size, seed=1)
+            spread = max(high - low for low, high in obj_estimate.intervals) / 2
+            print('{:<8} {:>6} {:>6.3f} {:>6.3f} {:>6.3f} {:>7.4f} {:>8} {:>8.2f} {:>11.0f}'.format(
+                name, batch_size, *obj_estimate.frequencies, spread, obj_estimate.playouts, obj_estimate.seconds,
+                obj_estimate.playouts_per_second), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
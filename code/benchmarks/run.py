@@ -0,0 +1,179 @@
+#
+# ConnectZ benchmark suite
+#
+# Generates each scenario's game with a fixed seed, then measures:
+#   move_rate          -- `Game.move` calls per second, best over the repeats
+#   run_game_seconds   -- `ConnectZ.run_game` wall time, best over the repeats
+#   peak_memory_bytes  -- peak traced allocation during one `ConnectZ.run_game`
+#
+# Results are compared against a stored baseline and anything worse by more than the tolerance is flagged as a
+# regression, in which case the exit status is 1.
+#
+# Usage, from the directory holding connectz.py:
+#   python -m benchmarks.run [--scenario NAME] [--save-baseline] [--output results.json]
+#
+
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from connectz import ConnectZ
+from connectz import GameException
+from connectz import new_game
+from benchmarks.generator import generate_game
+from benchmarks.generator import write_game
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Name, width, height, counters, outcome and moves played before the game may end
+SCENARIOS = [
+    ('classic_late_win', 7, 6, 4, 1, 30),
+    ('classic_draw', 7, 6, 4, 0, None),
+    ('full_board_draw', 60, 40, 4, 0, None),
+    ('late_win', 60, 40, 6, 2, 1800),
+    ('large_z_win', 200, 200, 50, 1, 20000),
+    ('wide_small_z', 20000, 10, 3, 3, 50000),
+    ('very_wide_sparse', 1000000, 1000, 5, 3, 5000),
+    ('tall_narrow', 4, 20000, 4, 3, 40000),
+    ('illegal_continue', 30, 30, 5, 4, 400),
+    ('illegal_row', 30, 30, 5, 5, 400),
+]
+
+# How each metric is compared with the baseline, True when bigger is better
+METRICS = (
+    ('move_rate', True),
+    ('run_game_seconds', False),
+    ('peak_memory_bytes', False),
+)
+
+
+def run_game(path, backend):
+    """
+    Judge a game file, returning its outcome or error code.
+    :rtype: int
+    """
+    try:
+        return ConnectZ(path, backend=backend).run_game()
+    except GameException as e:
+        return e.code
+
+
+def measure(lines, expected, backend, repeat):
+    """
+    Measure one generated game.
+    :param lines: Game file lines
+    :param expected: Outcome or error code the game should produce
+    :param backend: Game engine, one of `GAME_BACKENDS`
+    :param repeat: Times to play the game, the best time is kept
+    :rtype: dict
+    """
+    # Game.move throughput, up to the move that ends or breaks the game
+    move_seconds = None
+    for _ in range(repeat):
+        obj_game = new_game(lines[0], backend=backend)
+        moves = 0
+        start = time.perf_counter()
+        try:
+            for move_idx, column in enumerate(lines[1:]):
+                obj_game.move(column, move_idx % 2 + 1)
+                moves += 1
+        except GameException:
+            pass
+        elapsed = time.perf_counter() - start
+        move_seconds = elapsed if move_seconds is None else min(move_seconds, elapsed)
+
+    f = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False)
+    f.close()
+    try:
+        write_game(f.name, lines)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outcome = run_game(f.name, backend)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if outcome != expected:
+            raise AssertionError('Game gave {}, expected {}'.format(outcome, expected))
+        tracemalloc.start()
+        run_game(f.name, backend)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        os.unlink(f.name)
+    return {
+        'moves': moves,
+        'move_rate': moves / move_seconds if move_seconds else 0.0,
+        'run_game_seconds': best,
+        'peak_memory_bytes': peak,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results against the baseline, returning lines describing each metric and whether anything regressed.
+    :rtype: (list(str), bool)
+    """
+    report = []
+    b_regressed = False
+    for name, metrics in results.items():
+        for metric, b_higher_better in METRICS:
+            value = metrics[metric]
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                report.append('{:<20} {:<18} {:>14.6g}   (no baseline)'.format(name, metric, value))
+                continue
+            ratio = value / base
+            worse = ratio < 1 / (1 + tolerance) if b_higher_better else ratio > 1 + tolerance
+            b_regressed = b_regressed or worse
+            report.append('{:<20} {:<18} {:>14.6g} {:>7.2f}x baseline{}'.format(
+                name, metric, value, ratio, '   REGRESSION' if worse else ''))
+    return report, b_regressed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the ConnectZ engine.')
+    parser.add_argument('--scenario', action='append', help='only run the named scenario, may be repeated')
+    parser.add_argument('--backend', default='matrix', help='game engine (default matrix)')
+    parser.add_argument('--repeat', type=int, default=5, help='timing repeats, best time kept (default 5)')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before flagging (default 0.25)')
+    parser.add_argument('--save-baseline', action='store_true', help='write these results as the new baseline')
+    parser.add_argument('--output', help='also write results JSON here')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, width, height, counters, outcome, moves in SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        lines, expected = generate_game(name, width, height, counters, outcome, moves)
+        results[name] = measure(lines, expected, args.backend, args.repeat)
+        print('{:<20} {:>8} moves {:>10.4f}s'.format(name, results[name]['moves'], results[name]['run_game_seconds']),
+              file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        baseline = {'python': platform.python_version(), 'backend': args.backend, 'scenarios': results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        return 0
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['scenarios']
+    report, b_regressed = compare(results, baseline, args.tolerance)
+    print('\n'.join(report))
+    return 1 if b_regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,125 @@
+#
+# Load test for the live game server
+#
+# Opens `--connections` client connections, each holding `--sessions` games in play at once and sending moves round
+# robin between them, so connections x sessions games are live together. Games come from the seeded generator.
+# Reports requests per second and latency percentiles.
+#
+# Usage, from the directory holding connectz.py, with `python server.py` running:
+#   python -m benchmarks.server_load [--connections 100] [--sessions 100]
+#
+# `--serve` starts a server in this process instead.
+#
+
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from benchmarks.generator import generate_game
+from server import GameServer
+
+
+async def request(reader, writer, line, latencies):
+    """
+    Send one command and wait for its reply, recording the round trip.
+    :rtype: str
+    """
+    started = time.perf_counter()
+    writer.write((line + '\n').encode())
+    reply = await reader.readline()
+    latencies.append(time.perf_counter() - started)
+    return reply.decode().strip()
+
+
+async def client(host, port, games, latencies):
+    """
+    Play every argument game over one connection, moves interleaved between the games.
+    :param games: List of game file lines and expected outcome
+    :return: Games whose last reply didn't match the generated outcome
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    sessions = []  # Session, moves, last reply and expected outcome
+    for lines, expected in games:
+        reply = await request(reader, writer, 'NEW ' + lines[0], latencies)
+        sessions.append([reply.split()[1], lines[1:], None, expected])
+    mismatches = 0
+    move_idx = 0
+    while sessions:
+        for session in sessions:
+            if move_idx < len(session[1]):
+                session[2] = await request(reader, writer, 'MOVE {} {}'.format(session[0], session[1][move_idx]),
+                                           latencies)
+        move_idx += 1
+        finished = [session for session in sessions if move_idx >= len(session[1])]
+        for session in finished:
+            sessions.remove(session)
+            if session[2] is not None and int(session[2]) < 4:
+                await request(reader, writer, 'END ' + session[0], latencies)
+            mismatches += session[2] is not None and int(session[2]) != session[3]
+    writer.close()
+    return mismatches
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(args):
+    server = None
+    port = args.port
+    if args.serve:
+        obj_server = GameServer(max_sessions=args.connections * args.sessions)
+        server = await obj_server.start(args.host, args.port)
+        port = server.sockets[0].getsockname()[1]  # In case --port 0 picked one
+    # A pool of generated games reused by every client
+    pool = []
+    for seed in range(args.games):
+        lines, expected = generate_game(seed, 7, 6, 4, [0, 1, 2, 3, 4, 5][seed % 6])
+        pool.append((lines, expected))
+    latencies = []
+    clients = []
+    for client_idx in range(args.connections):
+        games = [pool[(client_idx * args.sessions + idx) % len(pool)] for idx in range(args.sessions)]
+        clients.append(client(args.host, port, games, latencies))
+    started = time.perf_counter()
+    mismatches = sum(await asyncio.gather(*clients))
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        while obj_server.connections:
+            await asyncio.sleep(0.01)  # Let the server see every client go
+        obj_server.stop()
+        server.close()
+        await server.wait_closed()
+    latencies.sort()
+    print('requests       {}'.format(len(latencies)))
+    print('mismatches     {}'.format(mismatches))
+    print('live sessions  {}'.format(args.connections * args.sessions))
+    print('seconds        {:.3f}'.format(elapsed))
+    print('requests/s     {:.0f}'.format(len(latencies) / elapsed))
+    for label, fraction in (('p50', 0.5), ('p99', 0.99), ('p99.9', 0.999)):
+        print('{:<14} {:.3f} ms'.format(label, percentile(latencies, fraction) * 1000))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Load test the ConnectZ game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--sessions', type=int, default=100, help='games in play per connection')
+    parser.add_argument('--games', type=int, default=60, help='distinct generated games (default 60)')
+    parser.add_argument('--serve', action='store_true', help='run the server in this process')
+    args = parser.parse_args(argv)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(run(args))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,94 @@
+#
+# Solver benchmark
+#
+# Solves the same 7x6x4 positions with the transposition table and centre-first move ordering switched on and off,
+# reporting nodes searched, time and nodes per second for each. Positions are taken part way through seeded generated
+# games, as the empty board is out of reach of a pure Python search.
+#
+# `--workers N` instead times `solve_parallel` with 1 to N processes against the serial solver and reports the speedup.
+#
+# Usage, from the directory holding connectz.py:
+#   python -m benchmarks.solver [--position NAME] [--workers N]
+#
+
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from benchmarks.generator import generate_game
+from solver import Solver
+from solver import solve_parallel
+
+# Name, generator seed and moves played before solving
+POSITIONS = [
+    ('midgame_22', 1, 22),
+    ('midgame_20', 1, 20),
+]
+
+# Name, transposition table bits and centre-first ordering
+CONFIGS = [
+    ('table+centre', 20, True),
+    ('table', 20, False),
+    ('centre', 0, True),
+    ('neither', 0, False),
+]
+
+
+def speedup(positions, workers):
+    """
+    Time the serial solver and `solve_parallel` with 1 to `workers` processes on each position.
+    :param positions: Names of the positions to solve, None for all
+    :param workers: Most processes to try
+    """
+    print('{:<12} {:>8} {:>6} {:>7} {:>10} {:>9} {:>8}'.format(
+        'position', 'workers', 'value', 'column', 'nodes', 'seconds', 'speedup'))
+    for name, seed, moves in POSITIONS:
+        if positions and name not in positions:
+            continue
+        lines, _ = generate_game(seed, 7, 6, 4, 3, 30)
+        serial = None
+        for count in [0] + list(range(1, workers + 1)):
+            started = time.perf_counter()
+            if count:
+                obj_solution = solve_parallel(lines[0], lines[1:moves + 1], workers=count)
+            else:
+                obj_solution = Solver(lines[0]).solve(lines[1:moves + 1])
+            seconds = time.perf_counter() - started  # Includes starting the pool
+            serial = serial or seconds
+            print('{:<12} {:>8} {:>6} {:>7} {:>10} {:>9.2f} {:>7.2f}x'.format(
+                name, count or 'serial', obj_solution.value, obj_solution.column, obj_solution.nodes, seconds,
+                serial / seconds), flush=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the ConnectZ solver.')
+    parser.add_argument('--position', action='append', help='only solve the named position, may be repeated')
+    parser.add_argument('--config', action='append', help='only use the named config, may be repeated')
+    parser.add_argument('--workers', type=int, help='time the parallel solver with 1 to this many processes')
+    args = parser.parse_args(argv)
+
+    if args.workers:
+        speedup(args.position, args.workers)
+        return 0
+    print('{:<12} {:<14} {:>6} {:>7} {:>10} {:>9} {:>9}'.format(
+        'position', 'config', 'value', 'column', 'nodes', 'seconds', 'nodes/s'))
+    for name, seed, moves in POSITIONS:
+        if args.position and name not in args.position:
+            continue
+        lines, _ = generate_game(seed, 7, 6, 4, 3, 30)
+        for config, table_bits, centre_first in CONFIGS:
+            if args.config and config not in args.config:
+                continue
+            obj_solution = Solver(lines[0], table_bits=table_bits, centre_first=centre_first).solve(
+                lines[1:moves + 1])
+            print('{:<12} {:<14} {:>6} {:>7} {:>10} {:>9.2f} {:>9.0f}'.format(
+                name, config, obj_solution.value, obj_solution.column, obj_solution.nodes, obj_solution.seconds,
+                obj_solution.nodes_per_second), flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
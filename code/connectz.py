@@ -13,13 +13,67 @@
 #
 # Tests will consist of horizontal, vertical and diagonal masks against the active board area.
 #
+# By default only the four lines through the last coin placed are tested, as that is the only coin that can complete a
+# line. The full active area scan is kept behind `full_scan` so the two can be checked against each other.
+#
+# Boards wider than `SPARSE_WIDTH` are held sparsely, so a huge board with a handful of moves stays small.
+#
+# `Game(..., threats=True)` also keeps a `ThreatMap`: the coins each player has in every window of `n` cells a win can
+# be made along, and the empty cells that would complete a window. Wins are then read from the windows through the
+# last coin, and `winning_columns` answers which columns win on the next move without trying each one.
+#
+# `BitboardGame` is an alternative engine holding each player's coins as a single int, selected with
+# `ConnectZ(..., backend='bitboard')`. `CompactGame` (`backend='compact'`) holds the board in a single bytearray with
+# `__slots__`, for keeping many live games in one process. Boards bigger than `DENSE_CELL_LIMIT` are played on `Game`
+# whichever backend is asked for.
+#
+# Run with `--batch` to judge many game files in one interpreter, fanned out over a process pool, or `--stream` to
+# judge games piped one after another through stdin. Add `--cache DIR` to a batch run to answer files judged on an
+# earlier run from a `ResultCache`. Add `--stats` or `--stats-json FILE` to a single game run to see
+# where its time goes.
+#
 
 
 import sys
 import os
+import argparse
+import functools
+import glob
+import json
+import locale
+import multiprocessing
+import struct
+import time
+from array import array
+from collections import defaultdict
 from pathlib import Path
 
 
+# Boards wider than this keep column heights in a dict and never build the dense game matrix
+SPARSE_WIDTH = 4096
+
+# Most cells the dense backends will hold, bits for `BitboardGame` and bytes for `CompactGame`. `new_game` plays bigger
+# boards on `Game`.
+DENSE_CELL_LIMIT = 1 << 24
+
+# Bump whenever a change could alter the outcome or error code of a game, so cached results are dropped
+ENGINE_VERSION = 1
+
+# Game snapshot header: magic, format version, width, height, counters, move count, active area start column, end
+# column and end row, then the outcome. The board follows, two bits per cell a row at a time, up to the active end row.
+SNAPSHOT_MAGIC = b'CNZS'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sB7qB')
+
+# Name, row step and column step of each line a win can be made along
+LINES = (
+    ('horizontal', 0, 1),
+    ('vertical', 1, 0),
+    ('incline', 1, 1),
+    ('decline', -1, 1),
+)
+
+
 class Error(Exception):
     """Base class"""
     pass
@@ -41,6 +95,59 @@ class GameException(Error):
         self.code = code
 
 
+class BoardSizeError(Error):
+    """Board is too big for a dense backend"""
+    pass
+
+
+def parse_config(conf):
+    """
+    Split the game configuration line into board width, board height and consecutive counter count.
+    :param conf: Game configuration
+    :return: (int, int, int)
+    """
+    # Split config line and attempt to cast them as ints
+    try:
+        lst_configs = [int(conf) for conf in conf.rstrip('\n').split()]
+    except Exception:
+        raise GameException(8)
+    # Check config value count
+    if len(lst_configs) != 3:
+        raise GameException(8)  # Code 8 -- Invalid file
+    # And that the game conditions are valid
+    if (lst_configs[0] < lst_configs[2]) and (lst_configs[1] < lst_configs[2]):
+        raise GameException(7)  # Code 7 -- illegal game
+    # A board without rows still takes coins along its bottom row, as the first coin always starts one
+    return lst_configs[0], max(lst_configs[1], 1), lst_configs[2]
+
+
+# Optional hot-path counters and phase timings. Games only pay for a `None` check per move when it isn't used.
+class GameStats(object):
+
+    def __init__(self):
+        """
+        Counters, e.g. cells read per direction or early exits from `_process_board`, and seconds spent per phase.
+        """
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def as_dict(self):
+        """
+        Machine-readable copy of the stats.
+        :rtype: dict
+        """
+        return {'counts': dict(self.counts), 'seconds': dict(self.seconds)}
+
+    def report(self):
+        """
+        Human-readable stats, one per line.
+        :rtype: str
+        """
+        lines = ['{:<28} {:>12}'.format(name, self.counts[name]) for name in sorted(self.counts)]
+        lines += ['{:<28} {:>12.6f}s'.format(name, self.seconds[name]) for name in sorted(self.seconds)]
+        return '\n'.join(lines)
+
+
 # Holds and handles anything to do with the ConnectZ game.
 class Game(object):
     # _board_width = 0  # Maximum board width
@@ -61,10 +168,14 @@ class Game(object):
     # _draw = False
     # _incomplete = True
 
-    def __init__(self, conf):
+    def __init__(self, conf, full_scan=False, stats=None, threats=False):
         """
         Game instantiation takes configuration settings.
         :param conf: Game configuration
+        :param full_scan: Rescan the whole active area after every move instead of only the lines through the last coin
+        :param stats: GameStats to record into
+        :param threats: Keep a `ThreatMap` for `winning_columns` and win checks, not available on sparse boards or for
+            `n` below 1
         """
         # Define instance variables.
         self._board_width = 0  # Maximum board width
@@ -75,31 +186,42 @@ class Game(object):
         self._active_game_end_column = 0
         # _active_game_start_row = 0
         self._active_game_end_row = 0
-        # Game matrix
-        self._the_game = []
+        # Coins placed, keyed by (row, column), and how high each column is stacked
+        self._cells = {}
+        self._column_heights = []
+        # Game matrix, only built when something reads the grid
+        self._the_game = None
         # Lets keep track of the number of moves made
         self._move_count = 0
+        # Columns played, so moves can be taken back, and the active area before each move that grew it as flat runs of
+        # (move count, start column, end column, end row)
+        self._history = None
+        self._area_history = array('q')
         # Game conditions
         self._player_one_win = False
         self._player_two_win = False
         self._draw = False
         self._incomplete = True
+        # Win detection mode
+        self._full_scan = full_scan
+        self._stats = stats
 
-        # Split config line and attempt to cast them as ints
-        try:
-            lst_configs = [int(conf) for conf in conf.rstrip('\n').split()]
-        except Exception:
-            raise GameException(8)
-        # Check config value count
-        if len(lst_configs) != 3:
-            raise GameException(8)  # Code 8 -- Invalid file
-        # And that the game conditions are valid
-        if (lst_configs[0] < lst_configs[2]) and (lst_configs[1] < lst_configs[2]):
-            raise GameException(7)  # Code 7 -- illegal game
-        # Populate board dimensions
-        self._board_width = lst_configs[0]
-        self._board_height = lst_configs[1]
-        self._counters = lst_configs[2]  # And consecutive counter count
+        # Populate board dimensions and consecutive counter count
+        self._board_width, self._board_height, self._counters = parse_config(conf)
+        # Sparse boards only hold what has been played, so memory follows the move count rather than the board size
+        self._sparse = self._board_width > SPARSE_WIDTH
+        self._history = array('H' if self._board_width <= 65536 else 'q')
+        if self._sparse:
+            self._column_heights = defaultdict(int)
+        else:
+            self._column_heights = [0] * self._board_width
+        self._threats = None
+        if threats:
+            if self._sparse:
+                raise Exception('No threat map on a sparse board')
+            if self._counters < 1:
+                raise Exception('No threat map for n below 1')
+            self._threats = ThreatMap(self._board_width, self._board_height, self._counters)
 
     def get_outcome(self):
         """
@@ -115,6 +237,91 @@ class Game(object):
         if self._incomplete:
             return 3
 
+    def _placed(self):
+        """
+        Coins on the board.
+        :return: Iterable of ((row, column), player)
+        """
+        return self._cells.items()
+
+    def _place(self, row_idx, column_idx, player):
+        """
+        Put a coin straight onto the board without any checks, used when loading a snapshot.
+        """
+        self._cells[(row_idx, column_idx)] = player
+        self._column_heights[column_idx] = max(self._column_heights[column_idx], row_idx + 1)
+        if self._threats is not None:
+            self._threats.place(row_idx, column_idx, player)
+
+    def to_snapshot(self):
+        """
+        Save the game state as a compact binary snapshot, see `SNAPSHOT_HEADER`.
+        :rtype: bytearray
+        """
+        width = self._board_width
+        board = bytearray((max(width, 0) * self._active_game_end_row + 3) // 4)
+        for (row_idx, column_idx), player in self._placed():
+            cell = row_idx * width + column_idx
+            board[cell >> 2] |= player << ((cell & 3) * 2)
+        snapshot = bytearray(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, width, self._board_height, self._counters, self._move_count,
+            self._active_game_start_column, self._active_game_end_column, self._active_game_end_row,
+            self.get_outcome()))
+        snapshot += board
+        return snapshot
+
+    @classmethod
+    def from_snapshot(cls, data, **kwargs):
+        """
+        Load a game saved by `to_snapshot`. The argument buffer is read in place through a `memoryview`, so bytes, a
+        bytearray or an mmap can be passed without copying, and only cells holding a coin are visited. A snapshot
+        doesn't keep the order moves were made in, so the loaded game has no moves to `undo`. A board holding other
+        than the move count of coins, a cell that isn't a player, or a coin above an empty cell is an invalid file.
+        :param data: Snapshot buffer
+        :param kwargs: Passed to the game constructor, e.g. `stats`
+        :rtype: Game
+        """
+        view = memoryview(data)
+        try:
+            (magic, version, width, height, counters, move_count, start_column, end_column,
+             end_row, outcome) = SNAPSHOT_HEADER.unpack_from(view)
+        except struct.error:
+            raise GameException(8)  # Truncated
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise GameException(8)
+        board = view[SNAPSHOT_HEADER.size:]
+        if len(board) != (max(width, 0) * end_row + 3) // 4 or outcome not in (0, 1, 2, 3):
+            raise GameException(8)
+        obj_game = cls('{} {} {}'.format(width, height, counters), **kwargs)
+        coins = []
+        column_heights = defaultdict(int)
+        for byte_idx, byte in enumerate(board):
+            while byte:
+                shift = (byte & -byte).bit_length() - 1 & ~1  # Lowest cell in this byte holding a coin
+                cell = byte_idx * 4 + shift // 2
+                player = (byte >> shift) & 3
+                if player == 3 or cell >= width * end_row or cell // width >= height:
+                    raise GameException(8)  # Not a player, or off the board
+                coins.append((cell // width, cell % width, player))
+                column_heights[cell % width] += 1
+                byte &= ~(3 << shift)
+        if len(coins) != move_count:
+            raise GameException(8)
+        for row_idx, column_idx, player in coins:
+            if row_idx >= column_heights[column_idx]:
+                raise GameException(8)  # Coin above an empty cell
+            obj_game._place(row_idx, column_idx, player)
+        obj_game._move_count = move_count
+        obj_game._active_game_start_column = start_column
+        obj_game._active_game_end_column = end_column
+        obj_game._active_game_end_row = end_row
+        if outcome in (1, 2):
+            obj_game._declare_winner(outcome)
+        elif outcome == 0:
+            obj_game._player_one_win = obj_game._player_two_win = obj_game._incomplete = False
+            obj_game._draw = True
+        return obj_game
+
     def _check_counters(self, lst_counters):
         """
         Check if the argument list of counters are all the same.
@@ -133,11 +340,70 @@ class Game(object):
             return True
         return False
 
+    def _declare_winner(self, player):
+        """
+        Update the outcome for a win by the argument player.
+        :type player: int
+        """
+        self._draw = self._incomplete = False
+        self._player_one_win = player == 1
+        self._player_two_win = player == 2
+
+    def _check_last_move(self, row_idx, column_idx):
+        """
+        Check the four lines through the coin just placed for `n` in a row.
+        Only the player who moved can have completed a line, so this gives the same result as a scan of the whole
+        active area while only walking at most `n - 1` cells either side of the coin.
+        :type row_idx: int
+        :type column_idx: int
+        :rtype: bool
+        """
+        stats = self._stats
+        player = self._cells[(row_idx, column_idx)]
+        for name, row_step, column_step in LINES:
+            run = 1  # The coin just placed
+            for direction in (1, -1):
+                # Walk away from the coin in both directions along this line
+                row = row_idx + row_step * direction
+                column = column_idx + column_step * direction
+                walked = run
+                while run < self._counters:
+                    if self._cells.get((row, column)) != player:
+                        break  # Line broken
+                    run += 1
+                    row += row_step * direction
+                    column += column_step * direction
+                if stats is not None:
+                    # Cells matched, plus the one that broke the line
+                    stats.counts['cells.' + name] += run - walked + (run < self._counters)
+            if stats is not None:
+                stats.counts['lines.' + name] += 1
+            if run >= self._counters:
+                # We have a winner
+                self._declare_winner(player)
+                return True
+        return False
+
+    def _board(self):
+        """
+        Return the game matrix, building it from the placed coins on first use. Once built it is kept up to date by
+        `move`. Sparse boards get a read-only view over the placed coins instead.
+        :rtype: list(list(int))
+        """
+        if self._the_game is None and self._sparse:
+            self._the_game = SparseBoard(self)
+        elif self._the_game is None:
+            self._the_game = [[0] * self._board_width for _ in range(self._active_game_end_row)]
+            for (row_idx, column_idx), player in self._cells.items():
+                self._the_game[row_idx][column_idx] = player
+        return self._the_game
+
     def _check_horizontal_win(self):
         """
         Check to see if a player has `n` in a row.
         :rtype: bool
         """
+        stats = self._stats
         b_have_winner = False
         # Build counter lists and check if all counters are the same
         # On a win update outcome and return True
@@ -154,6 +420,9 @@ class Game(object):
                     except IndexError:
                         b_check_counters = False
                         break  # Cell doesn't exist therefore end of row reached
+                if stats is not None:
+                    stats.counts['windows.horizontal'] += 1
+                    stats.counts['cells.horizontal'] += len(these_counters) + (not b_check_counters)
                 if b_check_counters:
                     # Test these counters
                     if self._check_counters(these_counters):
@@ -168,6 +437,7 @@ class Game(object):
         Check to see if a player has `n` in a column.
         :rtype: bool
         """
+        stats = self._stats
         b_have_winner = False
         # Build counter lists and check if all counters are the same
         # On a win update outcome and return True
@@ -184,6 +454,9 @@ class Game(object):
                     except IndexError:
                         b_check_counters = False
                         break  # Cell doesn't exist therefore top of board reached
+                if stats is not None:
+                    stats.counts['windows.vertical'] += 1
+                    stats.counts['cells.vertical'] += len(these_counters) + (not b_check_counters)
                 if b_check_counters:
                     # Test these counters
                     if self._check_counters(these_counters):
@@ -198,6 +471,7 @@ class Game(object):
         Check to see if a player has `n` in a inclining diagonal.
         :rtype: bool
         """
+        stats = self._stats
         b_have_winner = False
         # Build counter lists and check if all counters are the same
         # On a win update outcome and return True
@@ -214,6 +488,9 @@ class Game(object):
                     except IndexError:
                         b_check_counters = False
                         break  # Cell doesn't exist therefore edge of board reached
+                if stats is not None:
+                    stats.counts['windows.incline'] += 1
+                    stats.counts['cells.incline'] += len(these_counters) + (not b_check_counters)
                 if b_check_counters:
                     # Test these counters
                     if self._check_counters(these_counters):
@@ -228,6 +505,7 @@ class Game(object):
         Check to see if a player has `n` in a declining diagonal.
         :rtype: bool
         """
+        stats = self._stats
         b_have_winner = False
         # Build counter lists and check if all counters are the same
         # On a win update outcome and return True
@@ -246,6 +524,9 @@ class Game(object):
                     except IndexError:
                         b_check_counters = False
                         break  # Cell doesn't exist therefore edge of board reached
+                if stats is not None:
+                    stats.counts['windows.decline'] += 1
+                    stats.counts['cells.decline'] += len(these_counters) + (not b_check_counters)
                 if b_check_counters:
                     # Test these counters
                     if self._check_counters(these_counters):
@@ -255,6 +536,21 @@ class Game(object):
             # Then move to next row and repeat
         return b_have_winner
 
+    def _timed(self, name, check, *args):
+        """
+        Run a win check, adding its time to the stats. Only called when stats are being kept, so a game without them
+        pays no extra call.
+        :param name: Phase name
+        :param check: Method to run
+        :param args: Passed to the check
+        :rtype: bool
+        """
+        started = time.perf_counter()
+        try:
+            return check(*args)
+        finally:
+            self._stats.seconds['check.' + name] += time.perf_counter() - started
+
     def _process_board(self):
         """
         This is the main game engine and determines if the game has a winner or if the game is a draw.
@@ -266,25 +562,38 @@ class Game(object):
             raise GameException(4)  # code 4 -- Illegal continue
         # No point running check unless minimum moves reached
         if self._move_count - (self._counters - 1) < self._counters:
+            if self._stats is not None:
+                self._stats.counts['exit.min_moves'] += 1
             return False
+        self._board()  # Scanners read the matrix directly
         # Only interested in active board space
         if ((self._active_game_end_column - self._active_game_start_column) + 1 < self._counters) and (
                 self._active_game_end_row + 1 < self._counters):
+            if self._stats is not None:
+                self._stats.counts['exit.active_area'] += 1
             return False  # The active board area can't accommodate a win
         if self._active_game_end_row < self._counters:
             # Only horizontal wins will work
+            if self._stats is not None:
+                self._stats.counts['exit.horizontal_only'] += 1
+                return self._timed('horizontal', self._check_horizontal_win)
             return self._check_horizontal_win()
         if (self._active_game_end_column - self._active_game_start_column) + 1 < self._counters:
             # Only vertical wins can work due to horizontal distribution of counters
+            if self._stats is not None:
+                self._stats.counts['exit.vertical_only'] += 1
+                return self._timed('vertical', self._check_vertical_win)
             return self._check_vertical_win()
         # We have an active board area that requires all win vectors to be tested
-        if self._check_horizontal_win():
-            return True
-        if self._check_vertical_win():
-            return True
-        if self._check_diagonal_incline_win():
-            return True
-        if self._check_diagonal_decline_win():
+        if self._stats is None:
+            b_have_winner = self._check_horizontal_win() or self._check_vertical_win() or \
+                self._check_diagonal_incline_win() or self._check_diagonal_decline_win()
+        else:
+            b_have_winner = self._timed('horizontal', self._check_horizontal_win) or \
+                self._timed('vertical', self._check_vertical_win) or \
+                self._timed('incline', self._check_diagonal_incline_win) or \
+                self._timed('decline', self._check_diagonal_decline_win)
+        if b_have_winner:
             return True
         # Check for draw condition
         if self._move_count == (self._board_width * self._board_height):
@@ -294,13 +603,55 @@ class Game(object):
             return True
         return False
 
-    def move(self, column, player):
+    def _process_move(self, row_idx, column_idx):
         """
-        What player and which row is used to update the the game board.
-        When the board has been updated the `win checker` function is run to determine if the game has finished.
+        Incremental counterpart to `_process_board` that only tests the lines through the last coin placed.
+        Outcomes match `_process_board` for alternating play.
+        :param row_idx: Row of the last coin placed
+        :param column_idx: Column of the last coin placed
+        """
+        # Check to see if the game is already complete.
+        if self._player_one_win or self._player_two_win or self._draw:
+            # One too many moves, raise an exception
+            raise GameException(4)  # code 4 -- Illegal continue
+        # No point running check unless minimum moves reached
+        if self._move_count - (self._counters - 1) < self._counters:
+            if self._stats is not None:
+                self._stats.counts['exit.min_moves'] += 1
+            return False
+        if self._counters < 0:
+            return self._check_draw()  # No count of coins matches a negative `n`, so the board scan never finds a win
+        if self._threats is not None:
+            if self._threats.completes(row_idx, column_idx) if self._stats is None else \
+                    self._timed('threats', self._threats.completes, row_idx, column_idx):
+                self._declare_winner(self._cells[(row_idx, column_idx)])
+                return True
+        elif self._check_last_move(row_idx, column_idx) if self._stats is None else \
+                self._timed('last_move', self._check_last_move, row_idx, column_idx):
+            return True
+        return self._check_draw()
+
+    def _check_draw(self):
+        """
+        Check for a draw after a move that did not win.
+        The board scan only reaches its draw test once the active area can hold a win in every direction, so a full
+        board on a game narrower or shorter than `n` stays incomplete.
+        :rtype: bool
+        """
+        if self._move_count == (self._board_width * self._board_height) and \
+                self._board_width >= self._counters and self._board_height >= self._counters:
+            # All spaces populated with counters, therefore a draw
+            self._player_one_win = self._player_two_win = self._incomplete = False
+            self._draw = True
+            return True
+        return False
+
+    def _check_move(self, column, player):
+        """
+        Validate a move before it is made.
         :param column: str
         :param player: int 1 or 2
-        :return:
+        :return: int column number
         """
         # First check column can cast to int
         try:
@@ -312,60 +663,635 @@ class Game(object):
         if player not in [1, 2]:
             raise Exception('Not a valid player')
         # Now check column number is within allowable board dimensions
-        if column > self._board_width:
+        if column < 1 or column > self._board_width:
             raise GameException(6)
         # Now check to see if this is one too many moves.
         if self._player_one_win or self._player_two_win or self._draw:
             # We shouldn't have got to here, too many moves.
             raise GameException(4)  # Illegal continue
+        return column
+
+    def move(self, column, player):
+        """
+        What player and which row is used to update the the game board.
+        When the board has been updated the `win checker` function is run to determine if the game has finished.
+        :param column: str
+        :param player: int 1 or 2
+        :return:
+        """
+        if self._stats is None:
+            column = self._check_move(column, player)
+        else:
+            started = time.perf_counter()
+            try:
+                column = self._check_move(column, player)
+            finally:
+                self._stats.seconds['parse'] += time.perf_counter() - started
         # Move seems valid so make it
-        if not self._the_game:
-            # No moves made yet so create a row
-            new_row = [0] * self._board_width
-            new_row[column - 1] = 1  # And add counter for player 1
-            self._the_game.append(new_row)  # Update the board
+        return self._drop(column, player)
+
+    def play_columns(self, columns, player=1):
+        """
+        Play a run of column numbers already known to be on the board, players alternating from `player`. Skips the
+        per move casting and validation done by `move`.
+        :param columns: Iterable of int
+        :param player: int 1 or 2 to make the first move
+        """
+        for column in columns:
+            if self._player_one_win or self._player_two_win or self._draw:
+                raise GameException(4)  # Illegal continue
+            self._drop(column, player)
+            player = 3 - player  # Change players turn to go
+
+    def _drop(self, column, player):
+        """
+        Drop a coin into a valid column and process the board.
+        :param column: int
+        :param player: int 1 or 2
+        :rtype: bool
+        """
+        stats = self._stats
+        if stats is not None:
+            started = time.perf_counter()
+        column_idx = column - 1
+        row_idx = self._column_heights[column_idx]  # Coin stops on top of the column
+        if row_idx >= self._board_height:
+            raise GameException(5)  # code 5 -- Illegal row
+        self._history.append(column_idx)
+        start_column = self._active_game_start_column
+        end_column = self._active_game_end_column
+        end_row = self._active_game_end_row
+        if not self._cells:
+            # No moves made yet, first counter is player 1's
+            player = 1
             self._active_game_start_column = self._active_game_end_column = column  # And update active game space
-            self._active_game_end_row = 1
-        else:
-            b_coin_placed = False
-            row_idx = 0
-            # Find a row where the counter will stop
-            for row in self._the_game:
-                if not row[column - 1]:
-                    # No coin in the way
-                    self._the_game[row_idx][column - 1] = player
-                    b_coin_placed = True
-                    break
-                else:
-                    row_idx += 1  # Move to next row
-            if not b_coin_placed:
-                # All active rows are taken, need a new one
-                new_row = [0] * self._board_width
-                new_row[column - 1] = player  # And add counter for player
-                self._the_game.append(new_row)
-                # Quickly check that row count hasn't been exceeded
-                if len(self._the_game) > self._board_height:
-                    raise GameException(5)  # code 5 -- Illegal row
-            # Update active board space
-            if column < self._active_game_start_column:
-                self._active_game_start_column = column
-            if self._active_game_end_column < column:
-                self._active_game_end_column = column
-            if self._active_game_end_row < row_idx + 1:
-                self._active_game_end_row = row_idx + 1
+        self._cells[(row_idx, column_idx)] = player
+        self._column_heights[column_idx] = row_idx + 1
+        if self._threats is not None:
+            self._threats.place(row_idx, column_idx, player)
+        if self._the_game is not None and not self._sparse:
+            # Keep the matrix in step once it has been built
+            if len(self._the_game) == row_idx:
+                self._the_game.append([0] * self._board_width)
+            self._the_game[row_idx][column_idx] = player
+        # Update active board space
+        if column < self._active_game_start_column:
+            self._active_game_start_column = column
+        if self._active_game_end_column < column:
+            self._active_game_end_column = column
+        if self._active_game_end_row < row_idx + 1:
+            self._active_game_end_row = row_idx + 1
+        if start_column != self._active_game_start_column or end_column != self._active_game_end_column or \
+                end_row != self._active_game_end_row:
+            self._area_history.extend((self._move_count, start_column, end_column, end_row))
         self._move_count += 1  # Keep an eye in the number of moves
+        if stats is not None:
+            stats.seconds['place'] += time.perf_counter() - started
+            stats.counts['moves'] += 1
         # Now the board is updated, lets process the moves made
-        return self._process_board()
+        if self._full_scan:
+            return self._process_board()
+        return self._process_move(row_idx, column_idx)
+
+
+    def undo(self):
+        """
+        Take back the last move, restoring the board, active area, move count and outcome as they were before it.
+        Moves are only made while the game is in play, so the outcome goes back to incomplete.
+        :return: int column of the move taken back
+        """
+        if not self._history:
+            raise Exception('No moves to undo')
+        column_idx = self._history.pop()
+        row_idx = self._column_heights[column_idx] - 1
+        player = self._cells.pop((row_idx, column_idx))
+        if self._threats is not None:
+            self._threats.remove(row_idx, column_idx, player)
+        self._column_heights[column_idx] = row_idx
+        self._move_count -= 1
+        if self._area_history and self._area_history[-4] == self._move_count:
+            # This move grew the active area
+            self._active_game_start_column, self._active_game_end_column, end_row = self._area_history[-3:]
+            del self._area_history[-4:]
+            if self._the_game is not None and not self._sparse and end_row < self._active_game_end_row:
+                self._the_game.pop()  # Row held only this coin
+            self._active_game_end_row = end_row
+        if self._the_game is not None and not self._sparse and row_idx < len(self._the_game):
+            self._the_game[row_idx][column_idx] = 0
+        self._player_one_win = self._player_two_win = self._draw = False
+        self._incomplete = True
+        return column_idx + 1
+
+    def winning_columns(self, player):
+        """
+        Columns where a coin from the argument player would complete `n` in a row, read from the threat map.
+        :param player: int 1 or 2
+        :return: list(int) column numbers, smallest first
+        """
+        if self._threats is None:
+            raise Exception('Game has no threat map')
+        return sorted(column_idx + 1 for row_idx, column_idx in self._threats.winning_cells(player)
+                      if self._column_heights[column_idx] == row_idx)
+
+
+@functools.lru_cache(maxsize=32)
+def threat_windows(width, height, counters):
+    """
+    Every window of `counters` cells a win can be made along on the argument board, shared by all games of that size.
+    Cells are numbered `row * width + column`.
+    :return: (array, array, list(tuple(int))) first cell and cell step of each window, and the windows through each
+        cell
+    """
+    starts = array('q')
+    steps = array('q')
+    cell_windows = [[] for _ in range(width * height)]
+    for _, row_step, column_step in LINES:
+        step = row_step * width + column_step
+        for row_idx in range(height):
+            if not 0 <= row_idx + row_step * (counters - 1) < height:
+                continue  # Window would run off the top or bottom
+            for column_idx in range(width - column_step * (counters - 1)):
+                cell = row_idx * width + column_idx
+                for offset in range(counters):
+                    cell_windows[cell + offset * step].append(len(starts))
+                starts.append(cell)
+                steps.append(step)
+    return starts, steps, [tuple(windows) for windows in cell_windows]
+
+
+# Coins each player has in every window a win can be made along, kept up to date a coin at a time.
+class ThreatMap(object):
+
+    def __init__(self, width, height, counters):
+        """
+        Start an empty board. A cell is winning for a player while it is empty and some window through it holds
+        `counters - 1` of their coins and none of the other player's.
+        :type width: int
+        :type height: int
+        :type counters: int
+        """
+        self._width = width
+        self._counters = counters
+        self._starts, self._steps, self._cell_windows = threat_windows(width, height, counters)
+        self._board = bytearray(width * height)
+        typecode = 'B' if counters < 256 else 'q'
+        self._counts = (None, array(typecode, bytes(len(self._starts) * array(typecode).itemsize)),
+                        array(typecode, bytes(len(self._starts) * array(typecode).itemsize)))
+        # Winning cells of each player, with the number of windows making them so
+        self._winning = (None, {}, {})
+        if counters == 1:
+            # Every empty cell completes a window
+            for cell in range(width * height):
+                for windows in self._winning[1:]:
+                    windows[cell] = len(self._cell_windows[cell])
+
+    def _mark(self, player, cell):
+        winning = self._winning[player]
+        winning[cell] = winning.get(cell, 0) + 1
+
+    def _unmark(self, player, cell):
+        winning = self._winning[player]
+        if winning[cell] == 1:
+            del winning[cell]
+        else:
+            winning[cell] -= 1
+
+    def _empty_cell(self, window):
+        """
+        First empty cell of the argument window.
+        :rtype: int
+        """
+        cell, step = self._starts[window], self._steps[window]
+        while self._board[cell]:
+            cell += step
+        return cell
+
+    def place(self, row_idx, column_idx, player):
+        """
+        Add a coin, updating every window through its cell.
+        :type row_idx: int
+        :type column_idx: int
+        :param player: int 1 or 2
+        """
+        cell = row_idx * self._width + column_idx
+        self._board[cell] = player
+        own_counts, other_counts = self._counts[player], self._counts[3 - player]
+        need = self._counters - 1
+        for window in self._cell_windows[cell]:
+            own, other = own_counts[window], other_counts[window]
+            own_counts[window] = own + 1
+            if not own and other == need:
+                self._unmark(3 - player, cell)  # Other player's window is blocked
+            if not other:
+                if own == need:
+                    self._unmark(player, cell)  # Filled its own winning cell
+                elif own + 1 == need:
+                    self._mark(player, self._empty_cell(window))
+
+    def remove(self, row_idx, column_idx, player):
+        """
+        Take back a coin added by `place`, the reverse of each of its window updates.
+        :type row_idx: int
+        :type column_idx: int
+        :param player: int 1 or 2
+        """
+        cell = row_idx * self._width + column_idx
+        own_counts, other_counts = self._counts[player], self._counts[3 - player]
+        need = self._counters - 1
+        for window in self._cell_windows[cell]:
+            own, other = own_counts[window] - 1, other_counts[window]
+            own_counts[window] = own
+            if not own and other == need:
+                self._mark(3 - player, cell)
+            if not other:
+                if own == need:
+                    self._mark(player, cell)
+                elif own + 1 == need:
+                    self._unmark(player, self._empty_cell(window))  # Still sees this coin, so finds the other gap
+        self._board[cell] = 0
+
+    def completes(self, row_idx, column_idx):
+        """
+        Check whether the coin in the argument cell fills a window with its player's coins.
+        :type row_idx: int
+        :type column_idx: int
+        :rtype: bool
+        """
+        cell = row_idx * self._width + column_idx
+        counts = self._counts[self._board[cell]]
+        return any(counts[window] == self._counters for window in self._cell_windows[cell])
+
+    def winning_cells(self, player):
+        """
+        Empty cells that would complete a window for the argument player, whether or not a coin can reach them yet.
+        :param player: int 1 or 2
+        :return: set((row, column))
+        """
+        return {divmod(cell, self._width) for cell in self._winning[player]}
+
+
+# Game matrix rows for a sparse board, read straight from the placed coins.
+class SparseBoard(object):
+
+    def __init__(self, obj_game):
+        """
+        View of the argument game's coins with the same indexing as the game matrix. Reading off the end of a row or
+        above the active area raises `IndexError`, as the matrix does.
+        :type obj_game: Game
+        """
+        self._game = obj_game
+
+    def __len__(self):
+        return self._game._active_game_end_row
+
+    def __getitem__(self, row_idx):
+        if not 0 <= row_idx < self._game._active_game_end_row:
+            raise IndexError(row_idx)
+        return SparseRow(self._game, row_idx)
+
+
+class SparseRow(object):
+
+    def __init__(self, obj_game, row_idx):
+        """
+        View of one row of the argument game's coins.
+        :type obj_game: Game
+        :type row_idx: int
+        """
+        self._game = obj_game
+        self._row_idx = row_idx
+
+    def __len__(self):
+        return self._game._board_width
+
+    def __getitem__(self, column_idx):
+        if not 0 <= column_idx < self._game._board_width:
+            raise IndexError(column_idx)
+        return self._game._cells.get((self._row_idx, column_idx), 0)
+
+
+# Holds the game as one big int per player instead of a matrix.
+class BitboardGame(Game):
+
+    def __init__(self, conf, stats=None):
+        """
+        Game instantiation takes configuration settings.
+        Each column takes `height + 1` bits, the extra guard bit is never set so shifted runs can't wrap into the next
+        column.
+        :param conf: Game configuration
+        :param stats: GameStats to record into
+        """
+        super(BitboardGame, self).__init__(conf, stats=stats)
+        self._boards = [0, 0]  # Player 1 and player 2 coins
+        self._column_bits = self._board_height + 1
+        if self._board_width * self._column_bits > DENSE_CELL_LIMIT:
+            # A coin in the top corner would need an int of this many bits
+            raise BoardSizeError('{} bits is over DENSE_CELL_LIMIT'.format(self._board_width * self._column_bits))
+        # Bit shift to the neighbouring cell for horizontal, vertical, inclining and declining lines
+        self._shifts = (self._column_bits, 1, self._column_bits + 1, self._column_bits - 1)
+
+    def _placed(self):
+        """
+        Coins on the board, read back from the bitboards.
+        :return: Iterable of ((row, column), player)
+        """
+        for column_idx in range(self._board_width):
+            for row_idx in range(self._column_heights[column_idx]):
+                bit = 1 << (column_idx * self._column_bits + row_idx)
+                yield (row_idx, column_idx), 1 if self._boards[0] & bit else 2
+
+    def to_snapshot(self):
+        """
+        Save the game state as a compact binary snapshot. The active area isn't kept up while playing on bitboards, so
+        it is worked out from the column heights first.
+        :rtype: bytearray
+        """
+        columns = [column_idx + 1 for column_idx in range(self._board_width) if self._column_heights[column_idx]]
+        self._active_game_start_column = self._active_game_end_column = self._active_game_end_row = 0
+        if columns:
+            self._active_game_start_column, self._active_game_end_column = columns[0], columns[-1]
+            self._active_game_end_row = max(self._column_heights[column - 1] for column in columns)
+        return super(BitboardGame, self).to_snapshot()
+
+    def undo(self):
+        """
+        Take back the last move, restoring the board, move count and outcome as they were before it.
+        :return: int column of the move taken back
+        """
+        if not self._history:
+            raise Exception('No moves to undo')
+        column_idx = self._history.pop()
+        row_idx = self._column_heights[column_idx] - 1
+        bit = ~(1 << (column_idx * self._column_bits + row_idx))
+        self._boards[0] &= bit
+        self._boards[1] &= bit
+        self._column_heights[column_idx] = row_idx
+        self._move_count -= 1
+        self._player_one_win = self._player_two_win = self._draw = False
+        self._incomplete = True
+        return column_idx + 1
+
+    def _place(self, row_idx, column_idx, player):
+        """
+        Put a coin straight onto the board without any checks, used when loading a snapshot.
+        """
+        self._boards[player - 1] |= 1 << (column_idx * self._column_bits + row_idx)
+        self._column_heights[column_idx] = max(self._column_heights[column_idx], row_idx + 1)
+
+    def _check_run(self, board):
+        """
+        Check to see if the argument board has `n` in a row in any direction.
+        Each pass doubles the run length tested, so only O(log n) shifts are needed.
+        :type board: int
+        :rtype: bool
+        """
+        for (name, _, _), shift in zip(LINES, self._shifts):
+            runs = board  # Bits that start a run of `length` coins
+            length = 1
+            while length * 2 <= self._counters:
+                runs &= runs >> (shift * length)
+                length *= 2
+            if length < self._counters:
+                runs &= runs >> (shift * (self._counters - length))
+            if self._stats is not None:
+                self._stats.counts['shifts.' + name] += length.bit_length() - 1 + (length < self._counters)
+            if runs:
+                return True
+        return False
+
+    def _drop(self, column, player):
+        """
+        Drop a coin into a valid column and check the player's bitboard to determine if the game has finished.
+        :param column: int
+        :param player: int 1 or 2
+        :rtype: bool
+        """
+        stats = self._stats
+        if stats is not None:
+            started = time.perf_counter()
+        column_idx = column - 1
+        row_idx = self._column_heights[column_idx]  # Coin stops on top of the column
+        if row_idx >= self._board_height:
+            raise GameException(5)  # code 5 -- Illegal row
+        if not self._move_count:
+            # No moves made yet, first counter is player 1's
+            player = 1
+        self._boards[player - 1] |= 1 << (column_idx * self._column_bits + row_idx)
+        self._column_heights[column_idx] = row_idx + 1
+        self._history.append(column_idx)
+        self._move_count += 1  # Keep an eye in the number of moves
+        if stats is not None:
+            stats.seconds['place'] += time.perf_counter() - started
+            stats.counts['moves'] += 1
+        # No point running check unless minimum moves reached
+        if self._move_count - (self._counters - 1) < self._counters:
+            if stats is not None:
+                stats.counts['exit.min_moves'] += 1
+            return False
+        if self._counters < 0:
+            return self._check_draw()  # No count of coins matches a negative `n`, as on the matrix
+        if self._check_run(self._boards[player - 1]) if stats is None else \
+                self._timed('bitboard', self._check_run, self._boards[player - 1]):
+            # We have a winner
+            self._declare_winner(player)
+            return True
+        return self._check_draw()
+
+
+# Holds the game in as little memory as possible, for keeping many games in play at once.
+class CompactGame(object):
+    __slots__ = ('_board_width', '_board_height', '_counters', '_cells', '_column_heights', '_move_count', '_outcome',
+                 '_stats')
+
+    def __init__(self, conf, stats=None):
+        """
+        Game instantiation takes configuration settings.
+        The board is one byte per cell, column after column, so cell (row, column) is at `column * height + row`. The
+        whole board is allocated up front, so this suits many small games rather than one huge one, and boards of
+        more than `DENSE_CELL_LIMIT` cells are refused.
+        :param conf: Game configuration
+        :param stats: GameStats to record into
+        :exception: BoardSizeError
+        """
+        self._board_width, self._board_height, self._counters = parse_config(conf)
+        if self._board_width * (self._board_height + 1) > DENSE_CELL_LIMIT:
+            raise BoardSizeError('{}x{} board is over DENSE_CELL_LIMIT'.format(self._board_width, self._board_height))
+        self._cells = bytearray(max(self._board_width, 0) * max(self._board_height, 0))
+        # A byte per column height when the board is short enough
+        self._column_heights = array('B' if self._board_height < 256 else 'q', [0]) * max(self._board_width, 0)
+        self._move_count = 0
+        self._outcome = 3  # Outcome code, incomplete until someone wins or the board fills
+        self._stats = stats
+
+    def get_outcome(self):
+        """
+        Return the outcome of the game.
+        :return: int
+        """
+        return self._outcome
+
+    def move(self, column, player):
+        """
+        Validate a move then drop the coin, the same checks in the same order as `Game.move`.
+        :param column: str
+        :param player: int 1 or 2
+        :rtype: bool
+        """
+        try:
+            column = int(column)
+        except Exception:
+            raise GameException(8)
+        if player not in [1, 2]:
+            raise Exception('Not a valid player')
+        if column < 1 or column > self._board_width:
+            raise GameException(6)
+        if self._outcome != 3:
+            raise GameException(4)  # Illegal continue
+        return self._drop(column, player)
+
+    def play_columns(self, columns, player=1):
+        """
+        Play a run of column numbers already known to be on the board, players alternating from `player`.
+        :param columns: Iterable of int
+        :param player: int 1 or 2 to make the first move
+        """
+        for column in columns:
+            if self._outcome != 3:
+                raise GameException(4)  # Illegal continue
+            self._drop(column, player)
+            player = 3 - player  # Change players turn to go
+
+    def _check_last_move(self, row_idx, column_idx, player):
+        """
+        Check the four lines through the coin just placed for `n` in a row, stepping through the board by index.
+        :rtype: bool
+        """
+        cells = self._cells
+        height = self._board_height
+        width = self._board_width
+        counters = self._counters
+        for _, row_step, column_step in LINES:
+            index_step = column_step * height + row_step
+            run = 1  # The coin just placed
+            for direction in (1, -1):
+                row = row_idx + row_step * direction
+                column = column_idx + column_step * direction
+                index = column * height + row
+                while run < counters and 0 <= row < height and 0 <= column < width and cells[index] == player:
+                    run += 1
+                    row += row_step * direction
+                    column += column_step * direction
+                    index += index_step * direction
+            if run >= counters:
+                return True
+        return False
+
+    def _drop(self, column, player):
+        """
+        Drop a coin into a valid column and check the lines through it.
+        :param column: int
+        :param player: int 1 or 2
+        :rtype: bool
+        """
+        column_idx = column - 1
+        row_idx = self._column_heights[column_idx]  # Coin stops on top of the column
+        if row_idx >= self._board_height:
+            raise GameException(5)  # code 5 -- Illegal row
+        if not self._move_count:
+            # No moves made yet, first counter is player 1's
+            player = 1
+        self._cells[column_idx * self._board_height + row_idx] = player
+        self._column_heights[column_idx] = row_idx + 1
+        self._move_count += 1
+        if self._stats is not None:
+            self._stats.counts['moves'] += 1
+        # No point running check unless minimum moves reached
+        if self._move_count - (self._counters - 1) < self._counters:
+            return False
+        if self._counters >= 0 and self._check_last_move(row_idx, column_idx, player):
+            self._outcome = player  # We have a winner
+            return True
+        if self._move_count == self._board_width * self._board_height and \
+                self._board_width >= self._counters and self._board_height >= self._counters:
+            self._outcome = 0  # All spaces populated with counters, therefore a draw
+            return True
+        return False
+
+
+# Game engines selectable by `ConnectZ`
+GAME_BACKENDS = {
+    'matrix': Game,
+    'bitboard': BitboardGame,
+    'compact': CompactGame,
+}
+
+
+def new_game(conf, backend='matrix', full_scan=False, stats=None):
+    """
+    Create a game with the argument backend. Boards too big for a dense backend are played on `Game` instead.
+    :param conf: Game configuration
+    :param backend: Game engine, one of `GAME_BACKENDS`
+    :param full_scan: Passed through to `Game`
+    :param stats: GameStats to record into
+    :rtype: Game
+    """
+    if backend == 'matrix':
+        return Game(conf, full_scan=full_scan, stats=stats)
+    try:
+        return GAME_BACKENDS[backend](conf, stats=stats)
+    except BoardSizeError:
+        return Game(conf, stats=stats)
+
+
+def parse_columns(lines, width):
+    """
+    Convert move lines to column numbers in one bulk pass, checking them all against the board width up front.
+    Returns the columns before the first move `Game.move` would reject, and that move's error code (None when every
+    move is good).
+    :param lines: Move lines as bytes
+    :param width: Board width
+    :return: (array.array, int)
+    """
+    try:
+        columns = array('q', map(int, lines))
+        if not columns or (min(columns) >= 1 and max(columns) <= width):
+            return columns, None
+    except (ValueError, OverflowError):
+        pass
+    # Something is wrong, walk the moves to find the first bad one
+    columns = array('q')
+    for line in lines:
+        try:
+            column = int(line)
+        except ValueError:
+            try:
+                column = int(line.decode(locale.getpreferredencoding(False)))  # e.g. non-ASCII digits
+            except ValueError:
+                return columns, 8  # code 8 -- Invalid file
+        if column < 1 or column > width:
+            return columns, 6  # code 6 -- Illegal column
+        columns.append(column)
+    return columns, None
 
 
 class ConnectZ(object):
 
-    def __init__(self, file_input=None):
+    def __init__(self, file_input=None, full_scan=False, backend='matrix', bulk=True, stats=None):
         """
         Class instantiation requires file to be processed.
         :param file_input: ASCII file on disk
+        :param full_scan: Passed through to `Game`
+        :param backend: Game engine, one of `GAME_BACKENDS`
+        :param bulk: Read and convert the whole file at once rather than line by line
+        :param stats: GameStats to record into
         """
         self._this_file = None  # Game file to be processed
+        self._full_scan = full_scan
+        self._bulk = bulk
+        self._stats = stats
+        if backend not in GAME_BACKENDS:
+            raise Exception('Not a valid backend')
+        self._backend = backend
         try:
             # Test if file exists
             self._this_file = Path(file_input)
@@ -382,13 +1308,15 @@ class ConnectZ(object):
         :return: int
         :exception: GameException
         """
+        if self._bulk:
+            return self._run_game_bulk()
         obj_game = None
         players_go = 1  # Player 1 goes first
         with open(self._this_file) as f:
             for line in f:
                 if obj_game is None:
                     # First row contains game config
-                    obj_game = Game(line)
+                    obj_game = new_game(line, backend=self._backend, full_scan=self._full_scan, stats=self._stats)
                 else:
                     # Now we're making moves!
                     obj_game.move(line, players_go)
@@ -397,22 +1325,288 @@ class ConnectZ(object):
                         players_go = 2
                     else:
                         players_go = 1
+        if obj_game is None:
+            raise GameException(8)  # Empty file, code 8 -- Invalid file
         # All moves completed with no exceptions made. Return valid game state
         return obj_game.get_outcome()
 
+    def _run_game_bulk(self):
+        """
+        Run the file as `run_game` does, reading it in one go and converting all moves to ints before play starts.
+        Moves are played up to the first bad one, so an error earlier in the game still takes precedence.
+        :return: int
+        :exception: GameException
+        """
+        started = time.perf_counter()
+        with open(str(self._this_file), 'rb') as f:
+            lines = f.read().splitlines()  # Same line breaks as reading in text mode
+        if self._stats is not None:
+            self._stats.seconds['read'] += time.perf_counter() - started
+        if not lines:
+            raise GameException(8)  # Empty file, code 8 -- Invalid file
+        # First row contains game config
+        obj_game = new_game(lines[0].decode(locale.getpreferredencoding(False)), backend=self._backend,
+                            full_scan=self._full_scan, stats=self._stats)
+        started = time.perf_counter()
+        columns, error_code = parse_columns(lines[1:], obj_game._board_width)
+        if self._stats is not None:
+            self._stats.seconds['parse'] += time.perf_counter() - started
+        obj_game.play_columns(columns)
+        if error_code is not None:
+            raise GameException(error_code)
+        # All moves completed with no exceptions made. Return valid game state
+        return obj_game.get_outcome()
+
+
+def iter_outcomes(stream, delimiter=None, backend='matrix'):
+    """
+    Run every game in a text or binary stream, such as stdin or a pipe, yielding each game's outcome or error code as
+    soon as the game ends. Only the game being played is held in memory.
+    Games follow one another in the usual file format and are split either on a line matching `delimiter` or, with no
+    delimiter, on any line holding three values, which starts the next game. A game that raises an error skips the
+    rest of its lines.
+    :param stream: Iterable of str or bytes lines
+    :param delimiter: Line separating games, e.g. '' for a blank line
+    :param backend: Game engine, one of `GAME_BACKENDS`
+    :return: generator of int
+    """
+    obj_game = None
+    error_code = None  # Set once the current game has raised
+    b_started = False  # Config line for the current game has been read
+    players_go = 1
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        if delimiter is not None:
+            if line.strip() == delimiter:
+                # End of game
+                if b_started:
+                    yield error_code if error_code is not None else obj_game.get_outcome()
+                    obj_game, error_code, b_started, players_go = None, None, False, 1
+                continue
+        elif b_started and len(line.split()) == 3:
+            # Config line for the next game
+            yield error_code if error_code is not None else obj_game.get_outcome()
+            obj_game, error_code, b_started, players_go = None, None, False, 1
+        if not b_started:
+            # First row contains game config
+            b_started = True
+            try:
+                obj_game = new_game(line, backend=backend)
+            except GameException as e:
+                error_code = e.code
+        elif error_code is None:
+            # Now we're making moves!
+            try:
+                obj_game.move(line, players_go)
+            except GameException as e:
+                error_code = e.code
+            # Change players turn to go
+            players_go = 2 if players_go == 1 else 1
+    if b_started:
+        yield error_code if error_code is not None else obj_game.get_outcome()
+
+
+def iter_game_files(sources, pattern='*.txt', path_lists=()):
+    """
+    Expand directories, globs and files listing one path per line into game file paths.
+    Paths that don't exist are passed through so they are reported as file errors.
+    :param sources: Directories, globs or game files
+    :param pattern: File name pattern matched when walking directories
+    :param path_lists: Files holding one game file path per line, `-` for stdin
+    :return: generator of str
+    """
+    for path_list in path_lists:
+        f = sys.stdin if path_list == '-' else open(path_list)
+        try:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    for source in sources:
+        if os.path.isdir(source):
+            for path in sorted(Path(source).rglob(pattern)):
+                if path.is_file():
+                    yield str(path)
+        elif glob.has_magic(source):
+            for path in sorted(glob.iglob(source, recursive=True)):
+                yield path
+        else:
+            yield source
+
+
+def judge_file(path, backend='matrix'):
+    """
+    Run one game file, returning its outcome or error code rather than raising. Any other failure of the engine is
+    returned as an `error: <exception>` message, so one file can't stop a batch.
+    :param path: Game file
+    :param backend: Game engine, one of `GAME_BACKENDS`
+    :return: (str, int or str)
+    """
+    try:
+        return path, ConnectZ(path, backend=backend).run_game()
+    except GameException as e:
+        return path, e.code
+    except OSError:
+        return path, 9  # code 9 -- File error
+    except UnicodeDecodeError:
+        return path, 8  # code 8 -- Invalid file, not text
+    except Exception as e:
+        return path, 'error: {}: {}'.format(type(e).__name__, ' '.join(str(e).split()))
+
+
+def run_batch(paths, out=sys.stdout, workers=None, chunk_size=16, output_format='tsv', backend='matrix', cache=None):
+    """
+    Judge many game files over a process pool, writing each result as soon as its file is done. Results are therefore
+    not in input order.
+    :param paths: Iterable of game file paths
+    :param out: Text stream for results
+    :param workers: Process count, defaults to the CPU count. One runs in this process.
+    :param chunk_size: Paths handed to a worker at a time
+    :param output_format: `tsv` for `path<TAB>code` lines or `jsonl`
+    :param backend: Game engine, one of `GAME_BACKENDS`
+    :param cache: `ResultCache` to answer files from before any are judged, and to store new results in. File errors
+        and engine failures aren't stored, the next run may get further.
+    :return: Number of files judged
+    """
+    def write(path, code):
+        if output_format == 'jsonl':
+            out.write(json.dumps({'path': path, 'code': code}) + '\n')
+        else:
+            out.write('{}\t{}\n'.format(path, code))
+        out.flush()
+
+    count = 0
+    keys = {}
+    if cache is not None:
+        misses = []
+        for path in paths:
+            key = cache.key(path)
+            code = None if key is None else cache.get(key)
+            if code is None:
+                keys[path] = key
+                misses.append(path)
+            else:
+                write(path, code)
+                count += 1
+        paths = misses
+    judge = functools.partial(judge_file, backend=backend)
+    if workers == 1:
+        pool = None
+        results = map(judge, paths)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(judge, paths, chunk_size)
+    try:
+        for path, code in results:
+            write(path, code)
+            if keys.get(path) is not None and isinstance(code, int) and code != 9:
+                cache.put(keys[path], code)
+            count += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if cache is not None:
+            cache.commit()
+    return count
+
+
+def _batch_arguments(argv):
+    """
+    Parse `--batch` command line arguments.
+    :type argv: list(str)
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(prog='connectz.py --batch', description='Judge many game files.')
+    parser.add_argument('sources', nargs='*', help='game files, directories or globs')
+    parser.add_argument('--from', dest='path_lists', action='append', default=[], metavar='FILE',
+                        help='file listing one game file per line, - for stdin')
+    parser.add_argument('--pattern', default='*.txt', help='file name pattern used in directories (default *.txt)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=16, help='files per worker task (default 16)')
+    parser.add_argument('--format', dest='output_format', choices=['tsv', 'jsonl'], default='tsv')
+    parser.add_argument('--backend', choices=sorted(GAME_BACKENDS), default='matrix')
+    parser.add_argument('--cache', metavar='DIR', help='keep results in a cache in this directory')
+    parser.add_argument('--cache-key', choices=['content', 'stat'], default='content',
+                        help='key files by a hash of their content or by path, mtime and size (default content)')
+    parser.add_argument('--cache-size', type=int, default=1000000, help='most cached results (default 1000000)')
+    return parser.parse_args(argv)
+
+
+def _game_arguments(argv):
+    """
+    Parse single game command line arguments. Without `--stats` or `--stats-json` the one argument is the game file,
+    whatever it looks like.
+    :type argv: list(str)
+    :return: argparse.Namespace, None unless there is exactly one game file
+    """
+    if not any(arg == '--stats' or arg.startswith('--stats-json') for arg in argv):
+        return argparse.Namespace(file=argv[0], stats=False, stats_json=None) if len(argv) == 1 else None
+    parser = argparse.ArgumentParser(prog='connectz.py', description='Judge one game file.')
+    parser.add_argument('files', nargs='*', metavar='file', help='game file')
+    parser.add_argument('--stats', action='store_true', help='print hot-path counters and timings to stderr')
+    parser.add_argument('--stats-json', metavar='FILE', help='write hot-path counters and timings as JSON')
+    args, unknown = parser.parse_known_args(argv)
+    if unknown or len(args.files) != 1:
+        return None
+    args.file = args.files[0]
+    return args
+
+
+def _stream_arguments(argv):
+    """
+    Parse `--stream` command line arguments.
+    :type argv: list(str)
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(prog='connectz.py --stream', description='Judge games read from stdin.')
+    parser.add_argument('--delimiter', default=None,
+                        help='line separating games (default: a new config line starts the next game)')
+    parser.add_argument('--backend', choices=sorted(GAME_BACKENDS), default='matrix')
+    return parser.parse_args(argv)
+
 
 # Command line execution
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        # Incorrect command line argument count. Alert user
-        print('\rconnectz.py: Provide one \033[92minput \033[0mfile')  # Assumes ANSI available (Linux default)
+    if sys.argv[1:2] == ['--stream']:
+        args = _stream_arguments(sys.argv[2:])
+        for code in iter_outcomes(sys.stdin.buffer, delimiter=args.delimiter, backend=args.backend):
+            print(code, flush=True)
+    elif sys.argv[1:2] == ['--batch']:
+        args = _batch_arguments(sys.argv[2:])
+        obj_cache = None
+        if args.cache:
+            from resultcache import ResultCache
+            obj_cache = ResultCache(args.cache, max_entries=args.cache_size, key_mode=args.cache_key)
+        try:
+            run_batch(iter_game_files(args.sources, args.pattern, args.path_lists), workers=args.workers,
+                      chunk_size=args.chunk_size, output_format=args.output_format, backend=args.backend,
+                      cache=obj_cache)
+        finally:
+            if obj_cache is not None:
+                print(obj_cache.report(), file=sys.stderr)
+                obj_cache.close()
     else:
+        args = _game_arguments(sys.argv[1:])
+        if args is None:
+            # Incorrect command line argument count. Alert user
+            print('\rconnectz.py: Provide one \033[92minput \033[0mfile')  # Assumes ANSI available (Linux default)
+            sys.exit()
+        obj_stats = GameStats() if args.stats or args.stats_json else None
         try:
             # Run the game. Exceptions raised for game errors otherwise valid outcome found in get_outcome()
-            print(ConnectZ(sys.argv[1]).run_game())
+            print(ConnectZ(args.file, stats=obj_stats).run_game())
         except GameException as e:
             # Game error codes reported to user.
             print(e.code)
         except Exception as e:
             # Not good if got to here.
             raise e
+        finally:
+            if args.stats:
+                print(obj_stats.report(), file=sys.stderr)
+            if args.stats_json:
+                with open(args.stats_json, 'w') as f:
+                    json.dump(obj_stats.as_dict(), f, indent=2, sort_keys=True)
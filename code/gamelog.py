@@ -0,0 +1,303 @@
+#
+# ConnectZ binary game log
+#
+# Holds many games in one file so an archive doesn't need a text file per game or a parse per move.
+#
+#   header   magic b'CNZL', format version, game count and the offset of the index
+#   games    one record after another, each a record header (flags, config length, move count), the config line as
+#            written in the text file, then the moves as a fixed-width column array
+#   index    the offset of each game record, one int64 per game
+#
+# All numbers are little-endian. Each game's moves take the smallest of int8, int16, int32 or int64 that holds them,
+# given by the low two flag bits. A text file whose moves stop at a line that isn't a number keeps the moves before it
+# and sets `BAD_LINE`, and an empty text file sets `NO_CONFIG`, so every file keeps its outcome or error code.
+#
+# `GameLogReader` maps the file into memory and hands out a game's moves as a `memoryview` straight onto the map,
+# which can be played into a `Game` without building a string per move.
+#
+# Usage:
+#   python gamelog.py pack <archive> <text files...>
+#   python gamelog.py unpack <archive> <directory>
+#   python gamelog.py judge <archive>
+#
+
+
+import argparse
+import locale
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from connectz import GAME_BACKENDS
+from connectz import GameException
+from connectz import new_game
+
+LOG_MAGIC = b'CNZL'
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct('<4sBqq')
+RECORD_HEADER = struct.Struct('<BIq')
+
+# Move array typecodes by the low two flag bits, smallest first
+TYPECODES = ('b', 'h', 'i', 'q')
+BAD_LINE = 4  # Moves were cut short by a line that isn't a number, code 8
+NO_CONFIG = 8  # Empty text file, code 8
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+def parse_text_game(lines):
+    """
+    Split the lines of a text game file into its config line, the moves as ints and whether the moves stopped at a
+    line that isn't a number. Moves out of the int64 range are clamped, they are off the board either way.
+    :param lines: Lines of the text file as bytes
+    :return: (bytes, list(int), bool), config is None for an empty file
+    """
+    if not lines:
+        return None, [], False
+    columns = []
+    for line in lines[1:]:
+        try:
+            column = int(line)
+        except ValueError:
+            try:
+                column = int(line.decode(locale.getpreferredencoding(False)))  # e.g. non-ASCII digits
+            except ValueError:
+                return lines[0], columns, True
+        columns.append(min(max(column, INT64_MIN), INT64_MAX))
+    return lines[0], columns, False
+
+
+def encode_game(config, columns, b_bad_line=False):
+    """
+    Encode one game record.
+    :param config: Config line as bytes, None when the text file was empty
+    :param columns: Moves as ints
+    :param b_bad_line: Moves stopped at a line that isn't a number
+    :rtype: bytes
+    """
+    low = min(columns) if columns else 0
+    high = max(columns) if columns else 0
+    for flags, typecode in enumerate(TYPECODES):
+        bits = array(typecode).itemsize * 8
+        if -2 ** (bits - 1) <= low and high < 2 ** (bits - 1):
+            break
+    moves = array(typecode, columns)
+    if sys.byteorder == 'big':
+        moves.byteswap()
+    if b_bad_line:
+        flags |= BAD_LINE
+    if config is None:
+        flags |= NO_CONFIG
+        config = b''
+    return RECORD_HEADER.pack(flags, len(config), len(moves)) + config + moves.tobytes()
+
+
+def write_log(path, games):
+    """
+    Write games to a binary game log.
+    :param path: Archive to write
+    :param games: Iterable of (config, columns, b_bad_line) as returned by `parse_text_game`
+    :return: Games written
+    """
+    offsets = array('q')
+    with open(path, 'wb') as f:
+        f.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, 0, 0))  # Filled in once the index is written
+        for config, columns, b_bad_line in games:
+            offsets.append(f.tell())
+            f.write(encode_game(config, columns, b_bad_line))
+        index_offset = f.tell()
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        f.write(offsets.tobytes())
+        f.seek(0)
+        f.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, len(offsets), index_offset))
+    return len(offsets)
+
+
+def pack_text_files(paths, log_path):
+    """
+    Convert text game files into one binary game log, in the argument order.
+    :param paths: Text game files
+    :param log_path: Archive to write
+    :return: Games written
+    """
+    def games():
+        for path in paths:
+            with open(path, 'rb') as f:
+                yield parse_text_game(f.read().splitlines())
+
+    return write_log(log_path, games())
+
+
+class GameLogReader(object):
+
+    def __init__(self, path):
+        """
+        Map a binary game log into memory.
+        :param path: Archive to read
+        :exception: GameException 9 when the file can't be read, 8 when it isn't a game log
+        """
+        try:
+            self._file = open(path, 'rb')
+        except OSError:
+            raise GameException(9)  # code 9 -- File error
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            magic, version, self._games, index_offset = LOG_HEADER.unpack_from(self._view)
+            if magic != LOG_MAGIC or version != LOG_VERSION:
+                raise ValueError('Not a game log')
+            self._index = self._view[index_offset:index_offset + self._games * 8]
+            if len(self._index) != self._games * 8:
+                raise ValueError('Truncated game log')
+        except (ValueError, struct.error):
+            self.close()
+            raise GameException(8)  # code 8 -- Invalid file
+        self._index = self._cast(self._index, 'q')
+
+    @staticmethod
+    def _cast(view, typecode):
+        """
+        Read little-endian ints in place, copying only on a big-endian machine.
+        """
+        if sys.byteorder == 'big':
+            values = array(typecode, view.tobytes())
+            values.byteswap()
+            return values
+        return view.cast(typecode)
+
+    def __len__(self):
+        return self._games
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the map and the file. Moves handed out by `game` should be released first.
+        """
+        for name in ('_index', '_view'):
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        if getattr(self, '_map', None) is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # Moves handed out are still in use, the map goes when they do
+        self._file.close()
+
+    def game(self, game_idx):
+        """
+        Read one game straight off the map.
+        :param game_idx: Game number, from 0
+        :return: (bytes, memoryview, bool) config line, moves and whether a bad line followed them. Config is None
+            for an empty text file.
+        """
+        offset = self._index[game_idx]
+        flags, config_length, move_count = RECORD_HEADER.unpack_from(self._view, offset)
+        start = offset + RECORD_HEADER.size
+        config = None if flags & NO_CONFIG else bytes(self._view[start:start + config_length])
+        typecode = TYPECODES[flags & 3]
+        start += config_length
+        columns = self._cast(self._view[start:start + move_count * array(typecode).itemsize], typecode)
+        return config, columns, bool(flags & BAD_LINE)
+
+    def judge(self, game_idx, backend='matrix'):
+        """
+        Play one game, returning the outcome or error code `ConnectZ.run_game` gives for its text file.
+        :param game_idx: Game number, from 0
+        :param backend: Game engine, one of `GAME_BACKENDS`
+        :rtype: int
+        """
+        config, columns, b_bad_line = self.game(game_idx)
+        try:
+            if config is None:
+                raise GameException(8)  # Empty file, code 8 -- Invalid file
+            obj_game = new_game(config.decode(locale.getpreferredencoding(False)), backend=backend)
+            width = obj_game._board_width
+            error_code = 8 if b_bad_line else None
+            if len(columns) and (min(columns) < 1 or max(columns) > width):
+                # Play up to the first move off the board
+                bad = next(idx for idx, column in enumerate(columns) if column < 1 or column > width)
+                columns, error_code = columns[:bad], 6
+            obj_game.play_columns(columns)
+            if error_code is not None:
+                raise GameException(error_code)
+            return obj_game.get_outcome()
+        except GameException as e:
+            return e.code
+
+    def to_text(self, game_idx):
+        """
+        Rebuild a text game file with the same outcome as the argument game.
+        :param game_idx: Game number, from 0
+        :rtype: bytes
+        """
+        config, columns, b_bad_line = self.game(game_idx)
+        if config is None:
+            return b''
+        lines = [config] + [str(column).encode() for column in columns]
+        if b_bad_line:
+            lines.append(b'x')
+        return b'\n'.join(lines) + b'\n'
+
+
+def unpack_log(log_path, directory):
+    """
+    Convert a binary game log back into text game files, named by game number.
+    :param log_path: Archive to read
+    :param directory: Where to write the text files
+    :return: Paths written
+    """
+    paths = []
+    with GameLogReader(log_path) as reader:
+        digits = len(str(max(len(reader) - 1, 0)))
+        for game_idx in range(len(reader)):
+            path = os.path.join(directory, 'game_{:0{}d}.txt'.format(game_idx, digits))
+            with open(path, 'wb') as f:
+                f.write(reader.to_text(game_idx))
+            paths.append(path)
+    return paths
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Convert between ConnectZ text games and binary game logs.')
+    commands = parser.add_subparsers(dest='command')
+    pack = commands.add_parser('pack', help='pack text game files into a game log')
+    pack.add_argument('archive')
+    pack.add_argument('files', nargs='+')
+    unpack = commands.add_parser('unpack', help='write each game in a game log as a text file')
+    unpack.add_argument('archive')
+    unpack.add_argument('directory')
+    judge = commands.add_parser('judge', help='print the outcome of every game in a game log')
+    judge.add_argument('archive')
+    judge.add_argument('--backend', choices=sorted(GAME_BACKENDS), default='matrix')
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        print(pack_text_files(args.files, args.archive))
+    elif args.command == 'unpack':
+        os.makedirs(args.directory, exist_ok=True)
+        print(len(unpack_log(args.archive, args.directory)))
+    elif args.command == 'judge':
+        try:
+            reader = GameLogReader(args.archive)
+        except GameException as e:
+            print(e.code)
+            return
+        with reader:
+            for game_idx in range(len(reader)):
+                print(reader.judge(game_idx, args.backend))
+    else:
+        parser.print_usage()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
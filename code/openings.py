@@ -0,0 +1,169 @@
+#
+# ConnectZ prefix-sharing replay
+#
+# Judges many game files that share their opening moves without replaying each opening once per file. The moves of
+# every file are added to a trie, one per board configuration, where each node is a distinct run of moves from the
+# empty board. The trie is then walked depth first with a single game, making a node's move on the way down and taking
+# it back with `undo` on the way up, so the moves played are the trie's nodes rather than the moves in all the files.
+#
+# Every file still gets the outcome or error code `ConnectZ.run_game` gives it. A file ending at a node gets the game's
+# outcome there, or the error on the line after its last good move. A move that can't be made, into a full column or
+# after the game has ended, gives its error code to every file below it.
+#
+# Usage:
+#   python openings.py [--backend NAME] [--pattern GLOB] <sources...>
+#
+
+
+import argparse
+import locale
+import os
+import sys
+
+from connectz import GameException
+from connectz import iter_game_files
+from connectz import new_game
+from connectz import parse_columns
+from connectz import parse_config
+
+# Engines that can take moves back
+UNDO_BACKENDS = ('matrix', 'bitboard')
+
+
+class TrieNode(object):
+    __slots__ = ('children', 'files')
+
+    def __init__(self):
+        self.children = {}  # Next column to node
+        self.files = []  # (file number, error code of the line after the last move or None) of files ending here
+
+
+class OpeningTrie(object):
+
+    def __init__(self, backend='matrix'):
+        """
+        :param backend: Game engine, one of `UNDO_BACKENDS`
+        """
+        if backend not in UNDO_BACKENDS:
+            raise Exception('Backend can not take moves back')
+        self._backend = backend
+        self._roots = {}  # (config line, width, height, counters) to the node for the empty board
+        self._paths = []
+        self._results = []  # Outcome or error code of each file, None until replayed
+        self.moves = 0  # Moves in the files added
+        self.played = 0  # Moves made by the last `replay`
+
+    def __len__(self):
+        return len(self._paths)
+
+    def add_file(self, path):
+        """
+        Read a game file into the trie. Files that can't be read or have a bad config are judged straight away.
+        :param path: Game file
+        """
+        self._paths.append(path)
+        self._results.append(None)
+        try:
+            if not os.path.isfile(path):
+                raise GameException(9)  # code 9 -- File error
+            with open(path, 'rb') as f:
+                lines = f.read().splitlines()
+            if not lines:
+                raise GameException(8)  # Empty file, code 8 -- Invalid file
+            config = lines[0].decode(locale.getpreferredencoding(False))
+            key = (config,) + parse_config(config)
+        except GameException as e:
+            self._results[-1] = e.code
+            return
+        except OSError:
+            self._results[-1] = 9
+            return
+        except ValueError:
+            self._results[-1] = 8  # e.g. not text
+            return
+        columns, error_code = parse_columns(lines[1:], key[1])
+        node = self._roots.get(key)
+        if node is None:
+            node = self._roots[key] = TrieNode()
+        for column in columns:
+            child = node.children.get(column)
+            if child is None:
+                child = node.children[column] = TrieNode()
+            node = child
+        node.files.append((len(self._paths) - 1, error_code))
+        self.moves += len(columns)
+
+    def _settle(self, node, code):
+        """
+        Give every file ending at or below the argument node the same code.
+        """
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            for file_idx, _ in node.files:
+                self._results[file_idx] = code
+            nodes.extend(node.children.values())
+
+    def _replay_root(self, config, root):
+        """
+        Walk one configuration's trie with a single game.
+        :param config: Config line
+        :type root: TrieNode
+        """
+        obj_game = new_game(config, backend=self._backend)
+        stack = [iter(root.children.items())]
+        node = root
+        while True:
+            for file_idx, error_code in node.files:
+                self._results[file_idx] = obj_game.get_outcome() if error_code is None else error_code
+            node = None
+            while stack and node is None:
+                for column, node in stack[-1]:
+                    if obj_game.get_outcome() != 3:
+                        self._settle(node, 4)  # code 4 -- Illegal continue
+                        node = None
+                        continue
+                    try:
+                        obj_game._drop(column, len(stack) % 2 or 2)  # Players alternate from player 1
+                    except GameException as e:
+                        self._settle(node, e.code)  # Full column
+                        node = None
+                        continue
+                    self.played += 1
+                    break
+                else:
+                    stack.pop()
+                    if stack:
+                        obj_game.undo()  # Back to the parent's position
+            if node is None:
+                return
+            stack.append(iter(node.children.items()))
+
+    def replay(self):
+        """
+        Judge every file added.
+        :return: list((str, int)) path and outcome or error code, in the order the files were added
+        """
+        self.played = 0
+        for (config, _, _, _), root in self._roots.items():
+            self._replay_root(config, root)
+        return list(zip(self._paths, self._results))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Judge ConnectZ game files, replaying shared openings once.')
+    parser.add_argument('sources', nargs='+', help='game files, directories or globs')
+    parser.add_argument('--pattern', default='*.txt', help='file name pattern used in directories (default *.txt)')
+    parser.add_argument('--backend', choices=UNDO_BACKENDS, default='matrix')
+    args = parser.parse_args(argv)
+
+    obj_trie = OpeningTrie(backend=args.backend)
+    for path in iter_game_files(args.sources, args.pattern):
+        obj_trie.add_file(path)
+    for path, code in obj_trie.replay():
+        print('{}\t{}'.format(path, code))
+    print('{} files, {} moves, {} played'.format(len(obj_trie), obj_trie.moves, obj_trie.played), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
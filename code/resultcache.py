@@ -0,0 +1,129 @@
+#
+# ConnectZ result cache
+#
+# Keeps the outcome or error code of each judged game file in a SQLite database, so a batch rerun over files that
+# haven't changed only has to work out each file's key.
+#
+# Files are keyed either by a hash of their content, or more cheaply by path, modification time and size. Every lookup
+# or store stamps the entry with a rising counter, and once the cache holds more than `max_entries` the entries with
+# the oldest stamps are dropped. The cache remembers the `ENGINE_VERSION` its results were judged with and empties
+# itself when opened by a different version.
+#
+# Usage:
+#   python connectz.py --batch <sources...> --cache <directory> [--cache-key content|stat] [--cache-size N]
+#
+
+
+import hashlib
+import os
+import sqlite3
+
+from connectz import ENGINE_VERSION
+
+CACHE_FILE = 'results.sqlite3'
+KEY_MODES = ('content', 'stat')
+
+
+class ResultCache(object):
+
+    def __init__(self, directory, max_entries=1000000, key_mode='content', engine_version=ENGINE_VERSION):
+        """
+        Open or create the cache in the argument directory.
+        :param directory: Where the database is kept, created if missing
+        :param max_entries: Most results kept, least recently used are dropped first
+        :param key_mode: `content` to key files by a hash of their bytes, `stat` by path, modification time and size
+        :param engine_version: Results judged by any other version are dropped
+        """
+        if key_mode not in KEY_MODES:
+            raise ValueError('Unknown key mode {}'.format(key_mode))
+        os.makedirs(directory, exist_ok=True)
+        self._key_mode = key_mode
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(os.path.join(directory, CACHE_FILE))
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, code INTEGER NOT NULL, '
+                         'used INTEGER NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'engine_version'").fetchone()
+        if row is None or row[0] != str(engine_version):
+            # Judged by another engine, or a new cache
+            self._db.execute('DELETE FROM results')
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('engine_version', ?)", (str(engine_version),))
+        self._db.commit()
+        self._clock = self._db.execute('SELECT COALESCE(MAX(used), 0) FROM results').fetchone()[0]
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def key(self, path):
+        """
+        Cache key of a game file.
+        :param path: Game file
+        :return: str, None when the file can't be read
+        """
+        try:
+            if self._key_mode == 'stat':
+                stat = os.stat(path)
+                return 'stat:{}:{}:{}'.format(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+            with open(path, 'rb') as f:
+                return 'blake2b:' + hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        except OSError:
+            return None
+
+    def get(self, key):
+        """
+        Look up a result, counting the hit or miss.
+        :param key: From `key`
+        :return: int outcome or error code, None when not cached
+        """
+        row = self._db.execute('SELECT code FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._clock += 1
+        self._db.execute('UPDATE results SET used = ? WHERE key = ?', (self._clock, key))
+        return row[0]
+
+    def put(self, key, code):
+        """
+        Store a result.
+        :param key: From `key`
+        :param code: Outcome or error code
+        """
+        self._clock += 1
+        self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', (key, code, self._clock))
+
+    def commit(self):
+        """
+        Drop the least recently used results over `max_entries` and write everything to disk.
+        """
+        excess = len(self) - self._max_entries
+        if excess > 0:
+            self._db.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)',
+                             (excess,))
+        self._db.commit()
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        """
+        One line summary of hits and misses.
+        :rtype: str
+        """
+        return 'cache: {} hits, {} misses, {:.1%} hit rate'.format(self.hits, self.misses, self.hit_rate)
@@ -0,0 +1,182 @@
+#
+# ConnectZ live game server
+#
+# Holds many games in play at once over a line based TCP protocol on localhost. Each move is checked as it arrives,
+# so a game is never replayed.
+#
+#   NEW <width> <height> <counters>   ->  OK <session>       or  ERR <code>
+#   MOVE <session> <column>           ->  <outcome>          0 to 3, or an error code 4 to 8 which ends the session
+#   END <session>                     ->  OK
+#   STATS                             ->  OK <sessions> <connections>
+#
+# Unknown commands or sessions get `ERR unknown` and a full server gets `ERR busy`. Players alternate from player 1.
+#
+# Requests on a connection are answered in order and the server waits for each answer to drain before reading the
+# next, so a client that stops reading stops being served. Sessions not moved within the idle timeout are dropped.
+#
+
+
+import argparse
+import asyncio
+import sys
+
+from connectz import GAME_BACKENDS
+from connectz import GameException
+from connectz import new_game
+
+
+class Session(object):
+    """A game in play and whose move it is"""
+
+    def __init__(self, obj_game, now):
+        self.game = obj_game
+        self.player = 1
+        self.last_active = now
+
+
+class GameServer(object):
+
+    def __init__(self, max_sessions=100000, idle_timeout=300.0, backend='matrix', clock=None):
+        """
+        :param max_sessions: Games allowed in play at once
+        :param idle_timeout: Seconds a session or connection may go without a request
+        :param backend: Game engine, one of `GAME_BACKENDS`
+        :param clock: Returns the time in seconds, defaults to the event loop clock
+        """
+        self._max_sessions = max_sessions
+        self._idle_timeout = idle_timeout
+        self._backend = backend
+        self._clock = clock
+        self._sessions = {}
+        self._next_session = 1
+        self.connections = 0  # Clients connected
+        self._reaper = None
+
+    def _now(self):
+        if self._clock is not None:
+            return self._clock()
+        return asyncio.get_event_loop().time()
+
+    def command(self, line):
+        """
+        Run one protocol command and return the reply line.
+        :type line: str
+        :rtype: str
+        """
+        words = line.split()
+        if not words:
+            return 'ERR unknown'
+        verb = words[0].upper()
+        if verb == 'MOVE' and len(words) == 3:
+            session = self._sessions.get(words[1])
+            if session is None:
+                return 'ERR unknown'
+            session.last_active = self._now()
+            try:
+                session.game.move(words[2], session.player)
+            except GameException as e:
+                # Game over on an error
+                del self._sessions[words[1]]
+                return str(e.code)
+            session.player = 2 if session.player == 1 else 1
+            return str(session.game.get_outcome())
+        if verb == 'NEW':
+            if len(self._sessions) >= self._max_sessions:
+                return 'ERR busy'
+            try:
+                obj_game = new_game(' '.join(words[1:]), backend=self._backend)
+            except GameException as e:
+                return 'ERR {}'.format(e.code)
+            session_id = str(self._next_session)
+            self._next_session += 1
+            self._sessions[session_id] = Session(obj_game, self._now())
+            return 'OK ' + session_id
+        if verb == 'END' and len(words) == 2:
+            if self._sessions.pop(words[1], None) is None:
+                return 'ERR unknown'
+            return 'OK'
+        if verb == 'STATS':
+            return 'OK {} {}'.format(len(self._sessions), self.connections)
+        return 'ERR unknown'
+
+    def reap_idle(self):
+        """
+        Drop sessions that have gone without a request for longer than the idle timeout.
+        :return: Sessions dropped
+        """
+        cutoff = self._now() - self._idle_timeout
+        idle = [session_id for session_id, session in self._sessions.items() if session.last_active < cutoff]
+        for session_id in idle:
+            del self._sessions[session_id]
+        return len(idle)
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self._idle_timeout / 2)
+            self.reap_idle()
+
+    async def handle(self, reader, writer):
+        """
+        Serve one client connection until it closes or goes idle.
+        """
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self._idle_timeout)
+                except asyncio.TimeoutError:
+                    break  # Idle connection
+                if not line:
+                    break  # Client closed
+                writer.write((self.command(line.decode('utf-8', 'replace')) + '\n').encode())
+                await writer.drain()  # Backpressure, don't read more until the client takes its replies
+        except (ConnectionError, ValueError):
+            pass  # Client went away, or sent an over-long line
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=7777):
+        """
+        Start listening and reaping idle sessions.
+        :rtype: asyncio.AbstractServer
+        """
+        self._reaper = asyncio.ensure_future(self._reap_forever())
+        return await asyncio.start_server(self.handle, host, port)
+
+    def stop(self):
+        """
+        Stop reaping idle sessions.
+        """
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Serve live ConnectZ games.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--max-sessions', type=int, default=100000)
+    parser.add_argument('--idle-timeout', type=float, default=300.0, help='seconds (default 300)')
+    parser.add_argument('--backend', choices=sorted(GAME_BACKENDS), default='matrix')
+    args = parser.parse_args(argv)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    obj_server = GameServer(args.max_sessions, args.idle_timeout, args.backend)
+    server = loop.run_until_complete(obj_server.start(args.host, args.port))
+    print('Serving on {}:{}'.format(args.host, args.port), file=sys.stderr)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        obj_server.stop()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,451 @@
+#
+# ConnectZ solver
+#
+# Works out the game-theoretic value of a position and the best column to play, for any board size and `n` read from
+# a game config line. Positions are replayed through `Game` first, so an illegal position raises the same error codes
+# as a game file would.
+#
+# The search is negamax with alpha-beta pruning on a bitboard per player, laid out as in `BitboardGame`. Iterative
+# deepening searches one move deeper each pass until a win or loss is proven or the whole game tree fits in the depth.
+# Columns are tried centre first, after the best column remembered for the position.
+#
+# Positions are remembered in a fixed-size transposition table indexed by a Zobrist hash, updated as each coin is
+# placed and lifted. A slot is replaced when the new result was searched at least as deep, or the old one is left over
+# from an earlier solve.
+#
+# Scores are from the point of view of the player to move: `cells + 1 - m` for a win on the `m`th coin, so quicker
+# wins score higher, the negative for a loss and 0 for a draw or an unknown result past the search depth.
+#
+# Usage:
+#   python solver.py <game file> [--max-depth N] [--workers N]
+#
+# `solve_parallel` splits the root columns of each deepening pass across a process pool, sharing the best root score
+# between workers so their searches still prune.
+#
+
+
+import argparse
+import ctypes
+import multiprocessing
+import random
+import sys
+import time
+
+from connectz import GameException
+from connectz import new_game
+
+# Transposition table entry bounds
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class Solution(object):
+    """Result of solving a position"""
+
+    def __init__(self, value, score, column, depth, b_exact, nodes, seconds):
+        """
+        :param value: 1 when the player to move wins, -1 when they lose, 0 for a draw or not yet known
+        :param score: Search score, see module comment
+        :param column: Best column, numbered from 1, None when the game is over
+        :param depth: Moves searched ahead
+        :param b_exact: Value is proven rather than the best found within the depth
+        :param nodes: Positions searched
+        :param seconds: Time taken
+        """
+        self.value = value
+        self.score = score
+        self.column = column
+        self.depth = depth
+        self.b_exact = b_exact
+        self.nodes = nodes
+        self.seconds = seconds
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+
+class Solver(object):
+
+    def __init__(self, conf, table_bits=20, centre_first=True, seed=0):
+        """
+        Solver for positions on the argument board.
+        :param conf: Game configuration
+        :param table_bits: Transposition table holds 2 ** table_bits entries, 0 for no table
+        :param centre_first: Try the centre columns first rather than left to right
+        :param seed: Seed for the Zobrist keys
+        """
+        obj_game = new_game(conf)  # Raises 7 or 8 on a bad config
+        self._conf = conf
+        self._width = obj_game._board_width
+        self._height = obj_game._board_height
+        self._counters = obj_game._counters
+        self._cells = self._width * self._height
+        self._column_bits = self._height + 1
+        # Bit shift to the neighbouring cell for horizontal, vertical, inclining and declining lines
+        self._shifts = (self._column_bits, 1, self._column_bits + 1, self._column_bits - 1)
+        columns = range(self._width)
+        if centre_first:
+            columns = sorted(columns, key=lambda column_idx: abs(2 * column_idx - (self._width - 1)))
+        self._order = list(columns)
+        self._random = random.Random(seed)
+        self._zobrist = {}  # Key per (bit, player), made on first use so huge boards cost nothing up front
+        self._table_size = 1 << table_bits if table_bits else 0
+        self._table_keys = [None] * self._table_size
+        self._table_entries = [None] * self._table_size
+        self._generation = 0
+        # Position being searched
+        self._boards = [0, 0]
+        self._heights = [0] * self._width
+        self._moves = 0
+        self._hash = 0
+        self.nodes = 0
+
+    def _zobrist_key(self, bit, player_idx):
+        key = self._zobrist.get((bit, player_idx))
+        if key is None:
+            key = self._zobrist[(bit, player_idx)] = self._random.getrandbits(64)
+        return key
+
+    def _has_run(self, board):
+        """
+        Check to see if the argument board has `n` in a row in any direction, as `BitboardGame._check_run`.
+        :type board: int
+        :rtype: bool
+        """
+        for shift in self._shifts:
+            runs = board
+            length = 1
+            while length * 2 <= self._counters:
+                runs &= runs >> (shift * length)
+                length *= 2
+            if length < self._counters:
+                runs &= runs >> (shift * (self._counters - length))
+            if runs:
+                return True
+        return False
+
+    def _bit(self, column_idx):
+        return 1 << (column_idx * self._column_bits + self._heights[column_idx])
+
+    def _play(self, column_idx):
+        """
+        Place a coin for the player to move.
+        """
+        player_idx = self._moves & 1
+        bit = self._bit(column_idx)
+        self._boards[player_idx] |= bit
+        self._hash ^= self._zobrist_key(bit, player_idx)
+        self._heights[column_idx] += 1
+        self._moves += 1
+
+    def _undo(self, column_idx):
+        """
+        Lift the coin last placed in the argument column.
+        """
+        self._moves -= 1
+        self._heights[column_idx] -= 1
+        player_idx = self._moves & 1
+        bit = self._bit(column_idx)
+        self._boards[player_idx] &= ~bit
+        self._hash ^= self._zobrist_key(bit, player_idx)
+
+    def _probe(self):
+        """
+        Transposition table entry for the position being searched.
+        :return: (depth, bound, score, column_idx, generation) or None
+        """
+        if not self._table_size:
+            return None
+        slot = self._hash & (self._table_size - 1)
+        if self._table_keys[slot] == self._hash:
+            return self._table_entries[slot]
+        return None
+
+    def _store(self, depth, bound, score, column_idx):
+        """
+        Remember a search result, unless it would replace a deeper one from this solve.
+        """
+        if not self._table_size:
+            return
+        slot = self._hash & (self._table_size - 1)
+        entry = self._table_entries[slot]
+        if entry is None or self._table_keys[slot] == self._hash or depth >= entry[0] or \
+                entry[4] != self._generation:
+            self._table_keys[slot] = self._hash
+            self._table_entries[slot] = (depth, bound, score, column_idx, self._generation)
+
+    def _open_node(self, depth, alpha, beta):
+        """
+        Everything done at a position before its columns are searched: immediate wins and forced blocks, score bounds
+        and the transposition table.
+        :return: (known, playable, alpha_start, alpha, beta) where `known` is the (score, column index) result when no
+            search is needed, otherwise None and the columns to search in order with the window to search them in
+        """
+        playable = [column_idx for column_idx in self._order if self._heights[column_idx] < self._height]
+        if not playable:
+            return (0, None), playable, alpha, alpha, beta  # Board full, a draw
+        board = self._boards[self._moves & 1]
+        for column_idx in playable:
+            if self._has_run(board | self._bit(column_idx)):
+                return (self._cells - self._moves, column_idx), playable, alpha, alpha, beta  # Win with the next coin
+        # Block the other player's winning columns, there is nothing else worth playing
+        board = self._boards[1 - (self._moves & 1)]
+        threats = [column_idx for column_idx in playable if self._has_run(board | self._bit(column_idx))]
+        if len(threats) > 1:
+            # Can't block both, lose to their next coin
+            return (self._moves + 1 - self._cells, threats[0]), playable, alpha, alpha, beta
+        if threats:
+            playable = threats
+        # Can't win before our coin after next, nor lose before their next coin, short of a draw
+        alpha = max(alpha, min(self._moves + 1 - self._cells, 0))
+        beta = min(beta, max(self._cells - self._moves - 2, 0))
+        if alpha >= beta:
+            return (alpha, playable[0]), playable, alpha, alpha, beta
+        if depth == 0:
+            return (0, None), playable, alpha, alpha, beta  # Not known within the depth
+        alpha_start = alpha
+        first = None
+        entry = self._probe()
+        if entry is not None:
+            first = entry[3]
+            if entry[0] >= depth:
+                if entry[1] == EXACT:
+                    return (entry[2], entry[3]), playable, alpha_start, alpha, beta
+                if entry[1] == LOWER:
+                    alpha = max(alpha, entry[2])
+                else:
+                    beta = min(beta, entry[2])
+                if alpha >= beta:
+                    return (entry[2], entry[3]), playable, alpha_start, alpha, beta
+        if first is not None and first in playable:
+            playable.remove(first)
+            playable.insert(0, first)
+        return None, playable, alpha_start, alpha, beta
+
+    def _close_node(self, depth, alpha_start, beta, best_score, best_column):
+        """
+        Remember the result of searching a position's columns.
+        """
+        if best_score <= alpha_start:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self._store(depth, bound, best_score, best_column)
+
+    def _negamax(self, depth, alpha, beta):
+        """
+        Score the position for the player to move, searching `depth` moves ahead.
+        :return: (int, int) score and best column index
+        """
+        self.nodes += 1
+        known, playable, alpha_start, alpha, beta = self._open_node(depth, alpha, beta)
+        if known is not None:
+            return known
+        best_score = None
+        best_column = playable[0]
+        for column_idx in playable:
+            self._play(column_idx)
+            score = -self._negamax(depth - 1, -beta, -alpha)[0]
+            self._undo(column_idx)
+            if best_score is None or score > best_score:
+                best_score, best_column = score, column_idx
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        self._close_node(depth, alpha_start, beta, best_score, best_column)
+        return best_score, best_column
+
+    def _set_position(self, columns):
+        """
+        Set up the position reached by playing the argument columns, already known to be legal.
+        :param columns: Moves so far, numbered from 1
+        """
+        self._boards = [0, 0]
+        self._heights = [0] * self._width
+        self._moves = 0
+        self._hash = 0
+        for column in columns:
+            self._play(int(column) - 1)
+
+    def _start(self, columns):
+        """
+        Check the argument moves are legal and set up their position for a new solve.
+        :return: Game outcome so far
+        :exception: GameException when the moves are illegal
+        """
+        obj_game = new_game(self._conf)
+        for move_idx, column in enumerate(columns):
+            obj_game.move(column, move_idx % 2 + 1)
+        self._set_position(columns)
+        self._generation += 1
+        self.nodes = 0
+        return obj_game.get_outcome()
+
+    def solve(self, columns=(), max_depth=None):
+        """
+        Solve the position reached by playing the argument columns, players alternating from player 1.
+        :param columns: Moves so far, numbered from 1
+        :param max_depth: Stop deepening after this many moves ahead, None to search until the value is proven
+        :rtype: Solution
+        :exception: GameException when the moves are illegal
+        """
+        started = time.perf_counter()
+        outcome = self._start(columns)
+        return self._deepen(lambda depth, limit: self._negamax(depth, -limit, limit), outcome, max_depth, started)
+
+    def _deepen(self, search, outcome, max_depth, started):
+        """
+        Iterative deepening over the position set up by `_start`.
+        :param search: Root search, called with the depth and the score limit, returning the score and column index
+        :param outcome: Game outcome so far
+        :param max_depth: Deepest search, None for no limit
+        :param started: `time.perf_counter` at the start of the solve
+        :rtype: Solution
+        """
+        if outcome != 3 or self._moves == self._cells:
+            # Game over, the player to move has lost if anyone won
+            return Solution(0 if outcome in (0, 3) else -1, 0 if outcome in (0, 3) else -1, None, 0, True, 0,
+                            time.perf_counter() - started)
+        empties = self._cells - self._moves
+        if max_depth is None:
+            max_depth = empties
+        limit = self._cells + 1
+        score = column_idx = 0
+        for depth in range(1, min(max_depth, empties) + 1):
+            score, column_idx = search(depth, limit)
+            if score != 0 or depth >= empties:
+                break
+        b_exact = score != 0 or depth >= empties
+        value = (score > 0) - (score < 0)
+        return Solution(value, score, column_idx + 1, depth, b_exact, self.nodes, time.perf_counter() - started)
+
+
+# Worker process state for `solve_parallel`
+_worker_solver = None
+_shared_best = None
+
+
+def _init_worker(conf, table_bits, centre_first, shared_best):
+    global _worker_solver, _shared_best
+    _worker_solver = Solver(conf, table_bits=table_bits, centre_first=centre_first)
+    _shared_best = shared_best
+
+
+def _search_child(task):
+    """
+    Score one root column in a worker, searched against the best root score found so far by any worker.
+    A column ahead of the holder of that score in search order is searched a point lower, so if it ties it is still
+    scored exactly and the first best column wins as it does in a serial search.
+    :param task: (columns, column_idx, rank, depth, beta) moves to the root, the column to play and its place in the
+        search order, root depth and upper bound
+    :return: (int, int, int, int) column index, score for the root player, the lower bound it was searched with and
+        nodes searched
+    """
+    columns, column_idx, rank, depth, beta = task
+    with _shared_best.get_lock():
+        alpha, holder = _shared_best[0], _shared_best[1]
+    lower = alpha - 1 if rank < holder else alpha
+    obj_solver = _worker_solver
+    obj_solver._set_position(list(columns) + [column_idx + 1])
+    nodes = obj_solver.nodes
+    score = -obj_solver._negamax(depth - 1, -beta, -lower)[0]
+    with _shared_best.get_lock():
+        if score > lower and (score > _shared_best[0] or (score == _shared_best[0] and rank < _shared_best[1])):
+            _shared_best[0], _shared_best[1] = score, rank
+    return column_idx, score, lower, obj_solver.nodes - nodes
+
+
+def solve_parallel(conf, columns=(), workers=None, max_depth=None, table_bits=20, centre_first=True):
+    """
+    Solve a position as `Solver.solve` does, with the root columns of each deepening pass searched across a process
+    pool. The eldest column is searched first on its own and the rest are then handed to whichever worker is free
+    (young brothers wait), each starting from the best root score found so far. Gives the same value, score and best
+    column as a serial solve.
+    :param conf: Game configuration
+    :param columns: Moves so far, numbered from 1
+    :param workers: Processes, defaults to the CPU count
+    :param max_depth: Stop deepening after this many moves ahead, None to search until the value is proven
+    :param table_bits: Transposition table size for each worker, as for `Solver`
+    :param centre_first: As for `Solver`
+    :rtype: Solution
+    :exception: GameException when the moves are illegal
+    """
+    started = time.perf_counter()
+    obj_solver = Solver(conf, table_bits=table_bits, centre_first=centre_first)
+    outcome = obj_solver._start(columns)
+    columns = [int(column) for column in columns]
+    # Best root score so far and the search order rank holding it
+    shared_best = multiprocessing.Array(ctypes.c_longlong, 2)
+
+    def search(depth, limit):
+        obj_solver.nodes += 1
+        known, playable, alpha_start, alpha, beta = obj_solver._open_node(depth, -limit, limit)
+        if known is not None:
+            return known
+        shared_best[0], shared_best[1] = alpha, len(playable)
+        results = {}
+        for batch in (playable[:1], playable[1:]):
+            if shared_best[0] >= beta:
+                break  # Eldest column cut the rest off
+            tasks = [(columns, column_idx, playable.index(column_idx), depth, beta) for column_idx in batch]
+            for column_idx, score, lower, nodes in pool.imap_unordered(_search_child, tasks):
+                results[column_idx] = (score, lower)
+                obj_solver.nodes += nodes
+        # First column in search order with the best exact score
+        best_column = None
+        for column_idx in playable:
+            if column_idx not in results:
+                continue
+            score, lower = results[column_idx]
+            if score > lower and (best_column is None or score > results[best_column][0]):
+                best_column = column_idx
+        if best_column is None:
+            best_column = playable[0]  # Nothing beat the lower bound, which is then the score
+        best_score = results[best_column][0]
+        obj_solver._close_node(depth, alpha_start, beta, best_score, best_column)
+        return best_score, best_column
+
+    pool = multiprocessing.Pool(workers, _init_worker, (conf, table_bits, centre_first, shared_best))
+    try:
+        return obj_solver._deepen(search, outcome, max_depth, started)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Find the value and best move of a ConnectZ position.')
+    parser.add_argument('file', help='game file, config line then the moves so far')
+    parser.add_argument('--max-depth', type=int, help='moves to search ahead (default until solved)')
+    parser.add_argument('--table-bits', type=int, default=20, help='transposition table size as a power of 2')
+    parser.add_argument('--workers', type=int, default=1, help='processes to search with (default 1)')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.file) as f:
+            lines = f.read().splitlines()
+        if not lines:
+            raise GameException(8)
+        if args.workers > 1:
+            obj_solution = solve_parallel(lines[0], lines[1:], args.workers, args.max_depth, args.table_bits)
+        else:
+            obj_solution = Solver(lines[0], table_bits=args.table_bits).solve(lines[1:], args.max_depth)
+    except OSError:
+        print(9)
+        return
+    except GameException as e:
+        print(e.code)
+        return
+    print('value   {}{}'.format(obj_solution.value, '' if obj_solution.b_exact else ' (not proven)'))
+    print('column  {}'.format(obj_solution.column))
+    print('depth   {}'.format(obj_solution.depth))
+    print('nodes   {}'.format(obj_solution.nodes))
+    print('nodes/s {:.0f}'.format(obj_solution.nodes_per_second))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,25 @@
+def random_moves(obj_random, width, height):
+    """
+    Mostly legal columns with the odd full or off-board column thrown in
+    """
+    heights = [0] * (width + 2)
+    moves = []
+    for _ in range(obj_random.randint(1, width * height + 1)):
+        columns = [column for column in range(1, width + 1) if heights[column] < height]
+        if not columns or obj_random.random() < 0.02:
+            columns = list(range(1, width + 2))
+        moves.append(obj_random.choice(columns))
+        heights[moves[-1]] += 1
+    return moves
+
+
+def play(obj_game, moves):
+    """
+    Play moves with alternating players, returning the outcome or error code
+    """
+    try:
+        for move_idx, column in enumerate(moves):
+            obj_game.move(column, move_idx % 2 + 1)
+        return obj_game.get_outcome()
+    except Exception as e:
+        return e.code
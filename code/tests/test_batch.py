@@ -0,0 +1,122 @@
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__) + '..')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))  # Shared test helpers
+from batch import estimate_outcomes
+from batch import evaluate_boards
+from batch import replay_games
+from connectz import Game
+from helpers import play
+from helpers import random_moves
+
+
+def random_play_odds(obj_game):
+    """
+    Exact chance of a draw, a player 1 win and a player 2 win when both players drop coins in open columns at random
+    """
+    width, height = obj_game._board_width, obj_game._board_height
+    outcome = obj_game.get_outcome()
+    odds = [0.0, 0.0, 0.0]
+    if outcome != 3 or obj_game._move_count == width * height:
+        odds[outcome if outcome != 3 else 0] = 1.0  # A full board without a winner counts as a draw
+        return odds
+    open_columns = [column for column in range(width) if obj_game._column_heights[column] < height]
+    for column in open_columns:
+        obj_game.move(column + 1, obj_game._move_count % 2 + 1)
+        for result, chance in enumerate(random_play_odds(obj_game)):
+            odds[result] += chance / len(open_columns)
+        obj_game.undo()
+    return odds
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_evaluate_boards(self):
+        """
+        Finished boards are scored with the same codes as `Game.get_outcome`
+        """
+        boards = np.zeros((5, 3, 3), dtype=np.int8)
+        boards[1, 0, :] = 1  # Horizontal
+        boards[2, :, 1] = 2  # Vertical
+        boards[3, [0, 1, 2], [0, 1, 2]] = 1  # Inclining
+        boards[4] = [[1, 2, 1], [1, 2, 1], [2, 1, 2]]  # Full without a winner
+        self.assertEqual(evaluate_boards(boards, 3).tolist(), [3, 1, 2, 1, 0])
+
+    def test_declining_diagonal(self):
+        """
+        Declining diagonal on a board wider than it is tall
+        """
+        boards = np.zeros((1, 2, 4), dtype=np.int8)
+        boards[0, [1, 0], [2, 3]] = 2
+        self.assertEqual(evaluate_boards(boards, 2).tolist(), [2])
+
+    def test_replay_matches_game(self):
+        """
+        Replaying random games in one batch gives the same outcome or error code as `Game`
+        """
+        obj_random = random.Random(3)
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '4 4 1', '8 8 5', '7 6 -1', '3 3 0']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            games = [random_moves(obj_random, width, height) for _ in range(300)]
+            outcomes, end_moves, boards = replay_games(conf, games)
+            expected = [play(Game(conf), moves) for moves in games]
+            self.assertEqual(outcomes.tolist(), expected, conf)
+            # Boards of games that finished cleanly score the same on their own
+            clean = outcomes < 4
+            self.assertEqual(evaluate_boards(boards[clean], int(conf.split()[2])).tolist(),
+                             outcomes[clean].tolist(), conf)
+
+    def test_replay_end_move(self):
+        """
+        Move that ended the game is reported, and a move after it is an illegal continue
+        """
+        outcomes, end_moves, _ = replay_games('3 3 3', [[1, 2, 1, 2, 1], [1, 2, 1, 2, 1, 2], [1, 2]])
+        self.assertEqual(outcomes.tolist(), [1, 4, 3])
+        self.assertEqual(end_moves.tolist(), [5, 6, 0])
+
+    def test_estimate_matches_exact(self):
+        """
+        Random playouts land within their confidence intervals of the exact random play odds
+        """
+        for conf, columns in [('4 3 3', [2, 3]), ('3 4 3', [1, 2, 2]), ('5 3 4', [3, 3, 2, 2, 1])]:
+            obj_game = Game(conf)
+            play(obj_game, columns)
+            obj_estimate = estimate_outcomes(obj_game, playouts=20000, seed=5, z=4.0)
+            self.assertEqual(obj_estimate.playouts, 20000)
+            self.assertAlmostEqual(sum(obj_estimate.frequencies), 1.0)
+            for exact, (low, high) in zip(random_play_odds(obj_game), obj_estimate.intervals):
+                self.assertTrue(low <= exact <= high, (conf, columns, exact, low, high))
+
+    def test_estimate_budgets(self):
+        """
+        Seeded estimates repeat, the time budget stops after a batch, and the game is left as it was
+        """
+        obj_game = Game('7 6 4')
+        obj_game.move(4, 1)
+        first = estimate_outcomes(obj_game, playouts=3000, batch_size=1000, seed=2)
+        second = estimate_outcomes(obj_game, playouts=3000, batch_size=700, seed=2)
+        self.assertEqual(first.counts, estimate_outcomes(obj_game, playouts=3000, batch_size=1000, seed=2).counts)
+        self.assertEqual(second.playouts, 3000)
+        self.assertEqual(estimate_outcomes(obj_game, playouts=10 ** 9, batch_size=100, seconds=0).playouts, 100)
+        self.assertEqual((obj_game._move_count, obj_game.get_outcome()), (1, 3))
+        self.assertGreater(first.playouts_per_second, 0)
+
+    def test_estimate_finished(self):
+        """
+        A finished game's outcome is certain
+        """
+        obj_game = Game('3 3 3')
+        play(obj_game, [1, 2, 1, 2, 1])
+        obj_estimate = estimate_outcomes(obj_game)
+        self.assertEqual(obj_estimate.frequencies, [0.0, 1.0, 0.0])
+        self.assertEqual(obj_estimate.intervals, [(0.0, 0.0), (1.0, 1.0), (0.0, 0.0)])
+        self.assertEqual(obj_estimate.playouts, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
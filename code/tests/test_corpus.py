@@ -0,0 +1,70 @@
+import os
+import sys
+import tarfile
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(__file__) + '..')
+from benchmarks.corpus import MANIFEST
+from benchmarks.corpus import generate_corpus
+from connectz import judge_file
+
+CONFIGS = ((7, 6, 4), (3, 3, 3), (5, 2, 3), (6, 6, 2), (4, 9, 4))
+EVEN_MIX = tuple((code, 1) for code in range(10))
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return [(path, int(code)) for path, code in (line.rstrip('\n').split('\t') for line in f)]
+
+
+class TestCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expected_codes(self):
+        """
+        Every game in the corpus is judged as its manifest expects, and every code turns up
+        """
+        for policy in ('random', 'weighted'):
+            output = os.path.join(self.directory.name, policy)
+            self.assertEqual(generate_corpus(output, 400, seed=3, configs=CONFIGS, mix=EVEN_MIX, policy=policy,
+                                             workers=1, shard_size=150)[0], 400)
+            expected = read_manifest(output)
+            self.assertEqual(len(expected), 400)
+            self.assertEqual({code for _, code in expected}, set(range(10)))
+            for path, code in expected:
+                self.assertEqual(judge_file(os.path.join(output, path))[1], code, (policy, path))
+
+    def test_archive_matches_files(self):
+        """
+        Archives hold the same games as the text files, whatever the worker count
+        """
+        files = os.path.join(self.directory.name, 'files')
+        archives = os.path.join(self.directory.name, 'archives')
+        generate_corpus(files, 120, seed=4, configs=CONFIGS, mix=EVEN_MIX, workers=1, shard_size=50)
+        generate_corpus(archives, 120, seed=4, configs=CONFIGS, mix=EVEN_MIX, b_archive=True, workers=2,
+                        shard_size=50)
+        self.assertEqual(read_manifest(files), read_manifest(archives))
+        self.assertEqual(sorted(name for name in os.listdir(archives) if name.endswith('.tar.gz')),
+                         ['00000.tar.gz', '00001.tar.gz', '00002.tar.gz'])
+        for path, code in read_manifest(files):
+            with tarfile.open(os.path.join(archives, path[:5] + '.tar.gz')) as archive:
+                try:
+                    data = archive.extractfile(path).read()
+                except KeyError:
+                    data = None  # Never written
+            if data is None:
+                self.assertEqual(code, 9)
+                self.assertFalse(os.path.exists(os.path.join(files, path)))
+            else:
+                with open(os.path.join(files, path), 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
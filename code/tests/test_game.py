@@ -1,10 +1,49 @@
+import io
 import os
+import random
+import subprocess
 import sys
+import tempfile
 import unittest
 
 sys.path.append(os.path.dirname(__file__) + '..')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))  # Shared test helpers
+import connectz
 from connectz import Game
+from connectz import BitboardGame
+from connectz import CompactGame
 from connectz import ConnectZ
+from connectz import GameException
+from connectz import GameStats
+from connectz import iter_game_files
+from connectz import iter_outcomes
+from connectz import judge_file
+from connectz import new_game
+from connectz import run_batch
+from helpers import play
+from helpers import random_moves
+
+
+def brute_winning_columns(obj_game, player):
+    """
+    Columns where the argument player's next coin makes `n` in a row, found by walking the lines through each one
+    """
+    columns = []
+    for column_idx in range(obj_game._board_width):
+        row_idx = obj_game._column_heights[column_idx]
+        if row_idx >= obj_game._board_height:
+            continue
+        for _, row_step, column_step in connectz.LINES:
+            run = 1
+            for direction in (1, -1):
+                row, column = row_idx + row_step * direction, column_idx + column_step * direction
+                while obj_game._cells.get((row, column)) == player:
+                    run += 1
+                    row, column = row + row_step * direction, column + column_step * direction
+            if run >= obj_game._counters:
+                columns.append(column_idx + 1)
+                break
+    return columns
 
 
 class TestGame(unittest.TestCase):
@@ -130,6 +169,493 @@ class TestGame(unittest.TestCase):
         """
         self.assertEqual(ConnectZ("/usr/src/app/tests/player_one_win_decline.txt").run_game(), 1)
 
+    def test_incremental_matches_full_scan(self):
+        """
+        Random games give the same outcome or error code with last-move checks as with full board scans
+        """
+        obj_random = random.Random(1)
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '2 5 3', '4 4 1', '6 6 2', '9 3 4', '7 6 -1', '4 4 -3', '3 3 0']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(200):
+                moves = random_moves(obj_random, width, height)
+                results = [play(Game(conf, full_scan=full_scan), moves) for full_scan in (True, False)]
+                self.assertEqual(results[0], results[1], (conf, moves))
+
+    def test_column_below_board(self):
+        """
+        Column zero is outside of board dimensions
+        """
+        try:
+            Game('2 2 2').move(0, 1)
+        except Exception as e:
+            self.assertEqual(e.code, 6)
+
+    def test_illegal_row_from_column_height(self):
+        """
+        A coin dropped into a full column is an illegal row, and the matrix is not built to find that out
+        """
+        obj_game = Game('2 3 3')
+        for player in [1, 2, 1]:
+            obj_game.move(1, player)
+        try:
+            obj_game.move(1, 2)
+        except Exception as e:
+            self.assertEqual(e.code, 5)
+        self.assertIsNone(obj_game._the_game)
+
+    def test_board_without_rows(self):
+        """
+        A board with no rows plays along its bottom row, on every backend
+        """
+        for backend in ('matrix', 'bitboard', 'compact'):
+            self.assertEqual(play(new_game('3 0 2', backend=backend), [2]), 3, backend)
+            self.assertEqual(play(new_game('3 0 2', backend=backend), [1, 3, 2]), 1, backend)
+            self.assertEqual(play(new_game('3 0 3', backend=backend), [3, 1, 2]), 3, backend)
+            self.assertEqual(play(new_game('4 -1 2', backend=backend), [4, 2, 3, 4]), 4, backend)
+            self.assertEqual(play(new_game('3 0 3', backend=backend), [1, 1]), 5, backend)
+
+    def test_sparse_board(self):
+        """
+        Huge board only holds the moves played, and wins are still found by both detection modes
+        """
+        for full_scan in (True, False):
+            obj_game = Game('1000000 1000000 5', full_scan=full_scan)
+            for move_idx in range(9):
+                obj_game.move([500000, 1][move_idx % 2] + move_idx // 2, move_idx % 2 + 1)
+            self.assertEqual(obj_game.get_outcome(), 1)
+            self.assertEqual(len(obj_game._column_heights), 9)
+
+    def test_sparse_matches_dense(self):
+        """
+        Random games give the same outcome or error code when held sparsely
+        """
+        obj_random = random.Random(5)
+        sparse_width = connectz.SPARSE_WIDTH
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '2 5 3', '6 6 2']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(100):
+                moves = random_moves(obj_random, width, height)
+                for full_scan in (True, False):
+                    dense = play(Game(conf, full_scan=full_scan), moves)
+                    try:
+                        connectz.SPARSE_WIDTH = 0
+                        sparse = play(Game(conf, full_scan=full_scan), moves)
+                    finally:
+                        connectz.SPARSE_WIDTH = sparse_width
+                    self.assertEqual(dense, sparse, (conf, moves))
+
+    def test_bitboard_scenarios(self):
+        """
+        Bitboard backend gives the same result as the matrix for every game file
+        """
+        for file_name in sorted(os.listdir('/usr/src/app/tests')):
+            if not file_name.endswith('.txt'):
+                continue
+            results = []
+            for backend in ('matrix', 'bitboard', 'compact'):
+                try:
+                    results.append(ConnectZ('/usr/src/app/tests/' + file_name, backend=backend).run_game())
+                except Exception as e:
+                    results.append(e.code)
+            self.assertEqual(results[0], results[1], file_name)
+            self.assertEqual(results[0], results[2], file_name)
+
+    def test_bitboard_matches_matrix(self):
+        """
+        Random games give the same outcome or error code on the bitboard as on the matrix
+        """
+        obj_random = random.Random(2)
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '2 5 3', '4 4 1', '6 6 2', '9 3 4', '8 8 5', '7 6 -1', '3 3 0']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(200):
+                moves = random_moves(obj_random, width, height)
+                self.assertEqual(play(Game(conf), moves), play(BitboardGame(conf), moves), (conf, moves))
+
+    def test_bitboard_size_limit(self):
+        """
+        Boards needing more bits than the limit are refused by the bitboard and played on the matrix instead
+        """
+        with self.assertRaises(connectz.BoardSizeError):
+            BitboardGame('1000000 1000000 5')
+        self.assertIsInstance(new_game('4096 4095 4', backend='bitboard'), BitboardGame)
+        obj_game = new_game('1000000 1000000 5', backend='bitboard')
+        self.assertNotIsInstance(obj_game, BitboardGame)
+        moves = [1000000, 1, 999999, 1, 999998, 1, 999997, 1, 999996]
+        self.assertEqual(play(obj_game, moves), 1)
+
+    def test_compact_matches_matrix(self):
+        """
+        Random games give the same outcome or error code on the compact board as on the matrix
+        """
+        obj_random = random.Random(5)
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '2 5 3', '4 4 1', '6 6 2', '9 3 4', '8 8 5', '3 300 4', '7 6 -1',
+                     '3 3 0']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(200):
+                moves = random_moves(obj_random, width, height)
+                self.assertEqual(play(Game(conf), moves), play(CompactGame(conf), moves), (conf, moves))
+
+    def test_compact_size_limit(self):
+        """
+        A board too big to allocate is refused by the compact backend, and judged on the matrix when asked for by name
+        """
+        with self.assertRaises(connectz.BoardSizeError):
+            CompactGame('1000000 1000000 5')
+        self.assertNotIsInstance(new_game('1000000 1000000 5', backend='compact'), CompactGame)
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for name, lines in [('huge', ['1000000 1000000 5', '1000000', '1', '999999', '1', '999998', '1', '999997',
+                                          '1', '999996']), ('small', ['3 3 3', '1', '2', '1', '2', '1'])]:
+                paths.append(os.path.join(directory, name + '.txt'))
+                with open(paths[-1], 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+            out = io.StringIO()
+            self.assertEqual(run_batch(paths, out=out, workers=2, backend='compact'), 2)
+            self.assertEqual(sorted(out.getvalue().splitlines()), ['{}\t1'.format(path) for path in paths])
+
+    def test_compact_slots(self):
+        """
+        Compact games have no per instance dict
+        """
+        obj_game = CompactGame('7 6 4')
+        self.assertFalse(hasattr(obj_game, '__dict__'))
+        self.assertEqual(len(obj_game._cells), 42)
+
+    def test_snapshot_round_trip(self):
+        """
+        A game loaded from a snapshot matches the replayed game, and plays on to the same outcome or error code
+        """
+        obj_random = random.Random(6)
+        sparse_width = connectz.SPARSE_WIDTH
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '9 3 4', '8 8 5', '4 4 1']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(50):
+                moves = random_moves(obj_random, width, height)
+                split = obj_random.randint(0, len(moves))
+                for new, b_sparse in [(Game, False), (Game, True), (BitboardGame, False)]:
+                    try:
+                        connectz.SPARSE_WIDTH = 0 if b_sparse else sparse_width
+                        replayed = new(conf)
+                        if play(replayed, moves[:split]) not in (0, 1, 2, 3):
+                            continue  # Nothing left to resume
+                        snapshot = replayed.to_snapshot()
+                        loaded = new.from_snapshot(bytes(snapshot))
+                        self.assertEqual(loaded.to_snapshot(), snapshot)
+                        self.assertEqual(loaded.get_outcome(), replayed.get_outcome())
+                        results = []
+                        for obj_game in (replayed, loaded):
+                            try:
+                                for move_idx in range(split, len(moves)):
+                                    obj_game.move(moves[move_idx], move_idx % 2 + 1)
+                                results.append(obj_game.get_outcome())
+                            except Exception as e:
+                                results.append(e.code)
+                        self.assertEqual(results[0], results[1], (conf, moves, split, new, b_sparse))
+                    finally:
+                        connectz.SPARSE_WIDTH = sparse_width
+
+    def test_undo_matches_replay(self):
+        """
+        Taking moves back leaves the game as if only the earlier moves had been played, and play carries on the same
+        """
+        obj_random = random.Random(10)
+        sparse_width = connectz.SPARSE_WIDTH
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '9 3 4', '4 4 1']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(40):
+                moves = random_moves(obj_random, width, height)
+                for new, kwargs, b_sparse in [(Game, {}, False), (Game, {'full_scan': True}, False),
+                                              (Game, {'full_scan': True}, True), (BitboardGame, {}, False)]:
+                    try:
+                        connectz.SPARSE_WIDTH = 0 if b_sparse else sparse_width
+                        obj_game = new(conf, **kwargs)
+                        played = []
+                        for move_idx, column in enumerate(moves):
+                            try:
+                                obj_game.move(column, move_idx % 2 + 1)
+                            except GameException:
+                                break
+                            played.append(column)
+                        back = obj_random.randint(0, len(played))
+                        for column in reversed(played[len(played) - back:]):
+                            self.assertEqual(obj_game.undo(), column)
+                        kept = played[:len(played) - back]
+                        replayed = new(conf, **kwargs)
+                        play(replayed, kept)
+                        self.assertEqual(obj_game.to_snapshot(), replayed.to_snapshot(), (conf, moves, back))
+                        results = []
+                        for obj_played in (obj_game, replayed):
+                            try:
+                                for move_idx in range(len(kept), len(moves)):
+                                    obj_played.move(moves[move_idx], move_idx % 2 + 1)
+                                results.append(obj_played.get_outcome())
+                            except GameException as e:
+                                results.append(e.code)
+                        self.assertEqual(results[0], results[1], (conf, moves, back, new, kwargs))
+                    finally:
+                        connectz.SPARSE_WIDTH = sparse_width
+
+    def test_undo_after_win(self):
+        """
+        A won game can be taken back and played on, and there is nothing to undo at the start
+        """
+        obj_game = Game('7 6 4')
+        play(obj_game, [1, 2, 1, 2, 1, 2, 1])
+        self.assertEqual(obj_game.get_outcome(), 1)
+        self.assertEqual(obj_game.undo(), 1)
+        self.assertEqual(obj_game.get_outcome(), 3)
+        obj_game.move(3, 1)
+        self.assertEqual(obj_game.get_outcome(), 3)
+        for _ in range(7):
+            obj_game.undo()
+        with self.assertRaises(Exception):
+            obj_game.undo()
+
+    def test_threats_match_lines(self):
+        """
+        The threat map gives the same outcomes as the line checks, and its winning columns match walking the lines
+        through every column, while playing forward and taking moves back
+        """
+        obj_random = random.Random(11)
+        for conf in ['7 6 4', '3 3 3', '5 2 3', '6 7 2', '9 3 4', '4 4 1']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(40):
+                moves = random_moves(obj_random, width, height)
+                self.assertEqual(play(Game(conf, threats=True), moves), play(Game(conf), moves), (conf, moves))
+                obj_game = Game(conf, threats=True)
+                played = 0
+                for move_idx, column in enumerate(moves):
+                    try:
+                        obj_game.move(column, move_idx % 2 + 1)
+                    except GameException:
+                        break
+                    played += 1
+                    for player in (1, 2):
+                        self.assertEqual(obj_game.winning_columns(player), brute_winning_columns(obj_game, player),
+                                         (conf, moves[:played], player))
+                for _ in range(played):
+                    obj_game.undo()
+                    for player in (1, 2):
+                        self.assertEqual(obj_game.winning_columns(player), brute_winning_columns(obj_game, player),
+                                         (conf, moves, player))
+
+    def test_threats_snapshot(self):
+        """
+        A game loaded with a threat map knows its threats, and sparse boards or an `n` below 1 can't have one
+        """
+        obj_game = Game('7 6 4')
+        play(obj_game, [4, 4, 3, 3, 5])
+        loaded = Game.from_snapshot(obj_game.to_snapshot(), threats=True)
+        self.assertEqual(loaded.winning_columns(1), [2, 6])
+        self.assertEqual(loaded.winning_columns(2), [])
+        self.assertEqual(loaded._threats.winning_cells(1), {(0, 1), (0, 5)})
+        with self.assertRaises(Exception):
+            obj_game.winning_columns(1)
+        with self.assertRaises(Exception):
+            Game('5000 6 4', threats=True)
+        for conf in ['7 6 0', '7 6 -1']:
+            with self.assertRaises(Exception):
+                Game(conf, threats=True)
+
+    def test_snapshot_invalid(self):
+        """
+        Snapshots that are truncated or of an unknown format are invalid files
+        """
+        obj_game = Game('7 6 4')
+        play(obj_game, [1, 2, 1, 2])
+        snapshot = obj_game.to_snapshot()
+        self.assertEqual(len(snapshot), connectz.SNAPSHOT_HEADER.size + 4)  # Two rows of 7 cells
+        header = list(connectz.SNAPSHOT_HEADER.unpack_from(snapshot))
+        board = snapshot[connectz.SNAPSHOT_HEADER.size:]
+
+        def corrupt(move_count, cells):
+            header[5] = move_count
+            return connectz.SNAPSHOT_HEADER.pack(*header) + bytes(cells)
+
+        self.assertEqual(bytes(board), b'\x09\x40\x02\x00')
+        for data in [snapshot[:10], snapshot[:-1], b'XXXX' + snapshot[4:], snapshot[:4] + b'\x02' + snapshot[5:],
+                     corrupt(4, [0x0b, 0x40, 0x02, 0x00]),  # Cell holding 3
+                     corrupt(5, [0x09, 0x40, 0x02, 0x00]),  # Fewer coins than moves
+                     corrupt(3, [0x09, 0x40, 0x02, 0x00]),  # More coins than moves
+                     corrupt(5, [0x09, 0x40, 0x06, 0x00]),  # Coin above an empty cell
+                     corrupt(5, [0x09, 0x40, 0x02, 0x10])]:  # Coin past the active end row
+            for new, kwargs in [(Game, {}), (Game, {'threats': True}), (BitboardGame, {})]:
+                with self.assertRaises(GameException) as context:
+                    new.from_snapshot(data, **kwargs)
+                self.assertEqual(context.exception.code, 8)
+
+    def test_bulk_matches_line_by_line(self):
+        """
+        Bulk loading gives the same outcome or error code as reading line by line, whichever error comes first
+        """
+        obj_random = random.Random(4)
+        for conf in ['7 6 4', '3 3 3', '5 2 3']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(100):
+                lines = [str(column) for column in random_moves(obj_random, width, height)]
+                for _ in range(obj_random.randint(0, 2)):
+                    # Spoil a line or two
+                    lines.insert(obj_random.randint(0, len(lines)), obj_random.choice(['x', '', '0', ' 2 ', '1.0']))
+                with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+                    f.write('\n'.join([conf] + lines) + obj_random.choice(['', '\n']))
+                    f.flush()
+                    results = []
+                    for bulk in (True, False):
+                        try:
+                            results.append(ConnectZ(f.name, bulk=bulk).run_game())
+                        except Exception as e:
+                            results.append(e.code)
+                self.assertEqual(results[0], results[1], (conf, lines))
+
+    def test_stats(self):
+        """
+        Stats count moves, early exits and cells read by the last move check
+        """
+        obj_stats = GameStats()
+        self.assertEqual(ConnectZ("/usr/src/app/tests/classic.txt", stats=obj_stats).run_game(), 1)
+        self.assertEqual(obj_stats.counts['moves'], 7)
+        self.assertEqual(obj_stats.counts['exit.min_moves'], 6)
+        self.assertEqual(obj_stats.counts['cells.vertical'], 4)
+        self.assertIn('check.last_move', obj_stats.seconds)
+        self.assertIn('parse', obj_stats.as_dict()['seconds'])
+
+    def test_stats_full_scan(self):
+        """
+        Stats count windows per direction and time each scanner
+        """
+        obj_stats = GameStats()
+        self.assertEqual(ConnectZ("/usr/src/app/tests/player_one_win_incline.txt", full_scan=True, bulk=False,
+                                  stats=obj_stats).run_game(), 1)
+        self.assertEqual(obj_stats.counts['windows.incline'], 1)
+        for name in ('horizontal', 'vertical', 'incline'):
+            self.assertIn('check.' + name, obj_stats.seconds)
+        self.assertNotIn('check.decline', obj_stats.seconds)
+
+
+class TestBatchRun(unittest.TestCase):
+
+    def test_batch_results(self):
+        """
+        Every file in the directory is reported with its own outcome or error code
+        """
+        paths = list(iter_game_files(['/usr/src/app/tests'])) + ['/does/not/exist/file.txt']
+        for workers in (1, 2):
+            out = io.StringIO()
+            self.assertEqual(run_batch(paths, out=out, workers=workers, chunk_size=3), len(paths))
+            results = dict(line.split('\t') for line in out.getvalue().splitlines())
+            self.assertEqual(results['/usr/src/app/tests/classic.txt'], '1')
+            self.assertEqual(results['/usr/src/app/tests/illegal_row.txt'], '5')
+            self.assertEqual(results['/does/not/exist/file.txt'], '9')
+
+    def test_batch_engine_failure(self):
+        """
+        A file that makes the engine fail gets an error result of its own and the rest of the batch carries on
+        """
+        class BrokenGame(Game):
+            def _drop(self, column, player):
+                if self._board_width == 5:
+                    raise IndexError('broken engine')
+                return super(BrokenGame, self)._drop(column, player)
+
+        connectz.GAME_BACKENDS['broken'] = BrokenGame
+        try:
+            with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+                f.write('5 4 3\n1\n')
+                f.flush()
+                paths = ['/usr/src/app/tests/classic.txt', f.name, '/usr/src/app/tests/draw.txt']
+                for workers in (1, 2):
+                    out = io.StringIO()
+                    self.assertEqual(run_batch(paths, out=out, workers=workers, backend='broken'), len(paths))
+                    results = dict(line.split('\t') for line in out.getvalue().splitlines())
+                    self.assertEqual(results, {'/usr/src/app/tests/classic.txt': '1',
+                                               '/usr/src/app/tests/draw.txt': '0',
+                                               f.name: 'error: IndexError: broken engine'})
+        finally:
+            del connectz.GAME_BACKENDS['broken']
+
+    def test_judge_file_errors(self):
+        """
+        A file that isn't text is an invalid file, but a ValueError from the engine is an engine failure
+        """
+        class BrokenGame(Game):
+            def _drop(self, column, player):
+                raise ValueError('broken engine')
+
+        connectz.GAME_BACKENDS['broken'] = BrokenGame
+        try:
+            with tempfile.NamedTemporaryFile('wb', suffix='.txt') as f:
+                f.write(b'7 6 4\n1\n')
+                f.flush()
+                self.assertEqual(judge_file(f.name), (f.name, 3))
+                self.assertEqual(judge_file(f.name, backend='broken'), (f.name, 'error: ValueError: broken engine'))
+            with tempfile.NamedTemporaryFile('wb', suffix='.txt') as f:
+                f.write(b'\xff\xfe 6 4\n1\n')
+                f.flush()
+                self.assertEqual(judge_file(f.name), (f.name, 8))
+        finally:
+            del connectz.GAME_BACKENDS['broken']
+
+    def test_batch_jsonl(self):
+        """
+        JSONL output carries path and code
+        """
+        out = io.StringIO()
+        run_batch(iter_game_files(['/usr/src/app/tests/draw*.txt']), out=out, workers=1, output_format='jsonl')
+        self.assertEqual(out.getvalue(), '{"path": "/usr/src/app/tests/draw.txt", "code": 0}\n')
+
+
+class TestStream(unittest.TestCase):
+
+    def test_stream_config_split(self):
+        """
+        A new config line starts the next game, errors only end their own game
+        """
+        stream = io.StringIO('7 6 4\n1\n2\n1\n2\n1\n2\n1\n3 3 4\n1\n3 3 3\n1\n4\n1\n3 3 3\n1\n2\n3\n2\n1\n2\n')
+        self.assertEqual(list(iter_outcomes(stream)), [1, 7, 6, 2])
+
+    def test_stream_delimiter(self):
+        """
+        Games split on a delimiter line from a binary stream
+        """
+        stream = io.BytesIO(b'3 3 3\n1\n2\n---\n3 3 3\n1\n1\n1\n1\n---\n2 2 2\n1\n2\n1\n---\n')
+        self.assertEqual(list(iter_outcomes(stream, delimiter='---', backend='bitboard')), [3, 5, 1])
+
+    def test_stream_is_lazy(self):
+        """
+        Outcomes are yielded before the rest of the stream is read
+        """
+        def lines():
+            yield '3 3 3\n'
+            yield '1\n'
+            yield '3 3 3\n'
+            raise AssertionError('Read past the second config line')
+        self.assertEqual(next(iter_outcomes(lines())), 3)
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def run_script(self, *argv):
+        completed = subprocess.run([sys.executable, '/usr/src/app/connectz.py'] + list(argv), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, universal_newlines=True)
+        return completed.returncode, completed.stdout
+
+    def test_one_file(self):
+        """
+        One argument is the game file, whatever it looks like, with or without stats
+        """
+        self.assertEqual(self.run_script('/usr/src/app/tests/classic.txt'), (0, '1\n'))
+        self.assertEqual(self.run_script('-x'), (0, '9\n'))
+        self.assertEqual(self.run_script('--stats', '/usr/src/app/tests/draw.txt'), (0, '0\n'))
+
+    def test_argument_count(self):
+        """
+        Any other argument count gets the usage message and a clean exit
+        """
+        for argv in ([], ['a.txt', 'b.txt'], ['--stats'], ['--stats', 'a.txt', 'b.txt']):
+            code, out = self.run_script(*argv)
+            self.assertEqual(code, 0, argv)
+            self.assertIn('Provide one', out, argv)
+
 
 if __name__ == '__main__':
     unittest.main()
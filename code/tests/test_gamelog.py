@@ -0,0 +1,99 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(__file__) + '..')
+from connectz import ConnectZ
+from connectz import GameException
+from gamelog import GameLogReader
+from gamelog import pack_text_files
+from gamelog import unpack_log
+
+
+def run_text(path):
+    """
+    Outcome or error code of a text game file
+    """
+    try:
+        return ConnectZ(path).run_game()
+    except GameException as e:
+        return e.code
+
+
+class TestGameLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = ['/usr/src/app/tests/' + file_name for file_name in sorted(os.listdir('/usr/src/app/tests'))
+                      if file_name.endswith('.txt')]
+        # Random games with the odd spoilt line, huge column, empty file or bad config
+        obj_random = random.Random(7)
+        for game_idx in range(150):
+            lines = [obj_random.choice(['7 6 4', '3 3 3', '5 2 3', '200 3 3'])]
+            width = int(lines[0].split()[0])
+            lines += [str(obj_random.randint(1, width)) for _ in range(obj_random.randint(0, 30))]
+            for _ in range(obj_random.randint(0, 2)):
+                lines.insert(obj_random.randint(1, len(lines)), obj_random.choice(
+                    ['x', '', '0', ' 2 ', '-3', str(2 ** 70), '٣']))
+            if game_idx % 50 == 0:
+                lines = [] if game_idx == 0 else ['7 x 4'] + lines[1:]
+            path = os.path.join(self.directory.name, 'random_{:03d}.txt'.format(game_idx))
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + ('\n' if lines else ''))
+            self.paths.append(path)
+        self.archive = os.path.join(self.directory.name, 'games.cnzl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_outcomes_match_text(self):
+        """
+        Every game judged from the log gives the outcome or error code of its text file, on every backend
+        """
+        self.assertEqual(pack_text_files(self.paths, self.archive), len(self.paths))
+        expected = [run_text(path) for path in self.paths]
+        with GameLogReader(self.archive) as reader:
+            self.assertEqual(len(reader), len(self.paths))
+            for backend in ('matrix', 'bitboard', 'compact'):
+                self.assertEqual([reader.judge(game_idx, backend) for game_idx in range(len(reader))], expected)
+
+    def test_round_trip(self):
+        """
+        Unpacking the log gives text files with the same outcomes
+        """
+        pack_text_files(self.paths, self.archive)
+        unpacked = os.path.join(self.directory.name, 'unpacked')
+        os.mkdir(unpacked)
+        paths = unpack_log(self.archive, unpacked)
+        self.assertEqual([run_text(path) for path in paths], [run_text(path) for path in self.paths])
+
+    def test_smallest_moves(self):
+        """
+        Moves on a small board take a byte each and are read in place
+        """
+        pack_text_files(['/usr/src/app/tests/player_one_win.txt'], self.archive)
+        with GameLogReader(self.archive) as reader:
+            config, columns, b_bad_line = reader.game(0)
+            self.assertEqual(config, b'3 3 3')
+            self.assertEqual(columns.format, 'b')
+            self.assertFalse(b_bad_line)
+            columns.release()
+
+    def test_invalid_log(self):
+        """
+        Files that aren't game logs are invalid files, missing ones are file errors
+        """
+        with open(self.archive, 'wb') as f:
+            f.write(b'7 6 4\n1\n2\n')
+        with self.assertRaises(GameException) as context:
+            GameLogReader(self.archive)
+        self.assertEqual(context.exception.code, 8)
+        with self.assertRaises(GameException) as context:
+            GameLogReader(os.path.join(self.directory.name, 'missing.cnzl'))
+        self.assertEqual(context.exception.code, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
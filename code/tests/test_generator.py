@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(__file__) + '..')
+from benchmarks.generator import generate_game
+from benchmarks.generator import write_game
+from connectz import ConnectZ
+
+
+class TestGenerator(unittest.TestCase):
+
+    def test_generated_outcomes(self):
+        """
+        Every generated game gives the outcome or error code it was generated for
+        """
+        for width, height, counters in [(7, 6, 4), (3, 3, 3), (20, 5, 5), (4, 30, 4)]:
+            for outcome in range(9):
+                for seed in range(3):
+                    lines, expected = generate_game(seed, width, height, counters, outcome)
+                    self.assertEqual(expected, outcome)
+                    with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+                        write_game(f.name, lines)
+                        try:
+                            result = ConnectZ(f.name).run_game()
+                        except Exception as e:
+                            result = e.code
+                    self.assertEqual(result, expected, (width, height, counters, outcome, seed))
+
+    def test_seeded(self):
+        """
+        Same seed gives the same game
+        """
+        self.assertEqual(generate_game(1, 7, 6, 4, 2, 20), generate_game(1, 7, 6, 4, 2, 20))
+        self.assertNotEqual(generate_game(1, 7, 6, 4, 2, 20), generate_game(2, 7, 6, 4, 2, 20))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(__file__) + '..')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))  # Shared test helpers
+from connectz import judge_file
+from helpers import random_moves
+from openings import OpeningTrie
+
+
+class TestOpenings(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = ['/usr/src/app/tests/' + file_name for file_name in sorted(os.listdir('/usr/src/app/tests'))
+                      if file_name.endswith('.txt')]
+        # Random games branching off a few shared openings, with the odd spoilt line, empty file or bad config
+        obj_random = random.Random(12)
+        for game_idx in range(300):
+            config = obj_random.choice(['7 6 4', '3 3 3', '5 2 3', '6 6 2'])
+            width, height = [int(value) for value in config.split()[:2]]
+            obj_opening = random.Random(obj_random.randint(0, 3))
+            moves = random_moves(obj_opening, width, height)[:obj_random.randint(0, width * height)]
+            moves += random_moves(obj_random, width, height)[:obj_random.randint(0, 6)]
+            lines = [config] + [str(column) for column in moves]
+            if obj_random.random() < 0.1:
+                lines.insert(obj_random.randint(1, len(lines)), obj_random.choice(['x', '', '0', '-3', '٣']))
+            if game_idx % 100 == 0:
+                lines = [] if game_idx == 0 else ['7 x 4'] + lines[1:]
+            if game_idx % 100 == 50:
+                lines[0] = '3 3 4'
+            path = os.path.join(self.directory.name, 'random_{:03d}.txt'.format(game_idx))
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + ('\n' if lines else ''))
+            self.paths.append(path)
+        self.paths.append(os.path.join(self.directory.name, 'missing.txt'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_matches_judge_file(self):
+        """
+        Every file gets the outcome or error code of judging it on its own, on each backend that can take moves back
+        """
+        expected = [judge_file(path) for path in self.paths]
+        self.assertIn(4, [code for _, code in expected])
+        for backend in ('matrix', 'bitboard'):
+            obj_trie = OpeningTrie(backend=backend)
+            for path in self.paths:
+                obj_trie.add_file(path)
+            self.assertEqual(obj_trie.replay(), expected, backend)
+            self.assertLess(obj_trie.played, obj_trie.moves)
+
+    def test_shared_opening(self):
+        """
+        Moves shared by several files are made once
+        """
+        games = [[1, 2, 1, 2, 1, 2, 1], [1, 2, 1, 2, 3], [1, 2, 1, 2, 3, 3], [1, 2, 1, 2, 1, 2, 1, 2]]
+        obj_trie = OpeningTrie()
+        for game_idx, moves in enumerate(games):
+            path = os.path.join(self.directory.name, 'shared_{}.txt'.format(game_idx))
+            with open(path, 'w') as f:
+                f.write('\n'.join(['7 6 4'] + [str(column) for column in moves]) + '\n')
+            obj_trie.add_file(path)
+        self.assertEqual([code for _, code in obj_trie.replay()], [1, 3, 3, 4])
+        self.assertEqual((obj_trie.moves, obj_trie.played), (26, 9))
+        with self.assertRaises(Exception):
+            OpeningTrie(backend='compact')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(__file__) + '..')
+from connectz import iter_game_files
+from connectz import run_batch
+from resultcache import ResultCache
+
+
+def batch_results(paths, **kwargs):
+    """
+    Results of a batch run by path
+    """
+    out = io.StringIO()
+    run_batch(paths, out=out, workers=1, **kwargs)
+    return dict(line.split('\t') for line in out.getvalue().splitlines())
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.games = os.path.join(self.directory.name, 'games')
+        shutil.copytree('/usr/src/app/tests', self.games, ignore=shutil.ignore_patterns('*.py', '__pycache__'))
+        self.cache_directory = os.path.join(self.directory.name, 'cache')
+        self.paths = list(iter_game_files([self.games])) + [os.path.join(self.games, 'missing.txt')]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_warm_rerun(self):
+        """
+        A rerun gives the same results as judging without a cache, all from the cache apart from the missing file
+        """
+        expected = batch_results(self.paths)
+        for key_mode in ('content', 'stat'):
+            with ResultCache(self.cache_directory, key_mode=key_mode) as obj_cache:
+                self.assertEqual(batch_results(self.paths, cache=obj_cache), expected)
+                self.assertEqual((obj_cache.hits, obj_cache.misses), (0, len(self.paths) - 1))
+            with ResultCache(self.cache_directory, key_mode=key_mode) as obj_cache:
+                self.assertEqual(batch_results(self.paths, cache=obj_cache), expected)
+                self.assertEqual((obj_cache.hits, obj_cache.misses), (len(self.paths) - 1, 0))
+                self.assertEqual(obj_cache.hit_rate, 1.0)
+
+    def test_changed_file(self):
+        """
+        A changed file is judged again under either key
+        """
+        path = os.path.join(self.games, 'incomplete.txt')
+        for key_mode in ('content', 'stat'):
+            with open(path, 'w') as f:
+                f.write('3 3 3\n1\n2\n1\n2\n')
+            with ResultCache(self.cache_directory, key_mode=key_mode) as obj_cache:
+                self.assertEqual(batch_results([path], cache=obj_cache), {path: '3'})
+            with open(path, 'a') as f:
+                f.write('1\n')
+            with ResultCache(self.cache_directory, key_mode=key_mode) as obj_cache:
+                self.assertEqual(batch_results([path], cache=obj_cache), {path: '1'})
+                self.assertEqual(obj_cache.misses, 1)
+
+    def test_engine_version(self):
+        """
+        Results judged by another engine version are dropped
+        """
+        with ResultCache(self.cache_directory) as obj_cache:
+            batch_results(self.paths, cache=obj_cache)
+            self.assertEqual(len(obj_cache), len(self.paths) - 1)
+        with ResultCache(self.cache_directory, engine_version='next') as obj_cache:
+            self.assertEqual(len(obj_cache), 0)
+
+    def test_least_recently_used(self):
+        """
+        Once over size the results used longest ago are dropped
+        """
+        with ResultCache(self.cache_directory, max_entries=2) as obj_cache:
+            for key, code in [('a', 1), ('b', 2), ('c', 0)]:
+                obj_cache.put(key, code)
+            self.assertEqual(obj_cache.get('a'), 1)
+            obj_cache.commit()
+            self.assertEqual(len(obj_cache), 2)
+            self.assertIsNone(obj_cache.get('b'))
+            self.assertEqual((obj_cache.get('a'), obj_cache.get('c')), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
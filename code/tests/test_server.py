@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(__file__) + '..')
+from server import GameServer
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.obj_server = GameServer(max_sessions=2, idle_timeout=10.0, clock=self.clock)
+
+    def test_win(self):
+        """
+        Moves alternate between players and the reply is the outcome so far
+        """
+        session = self.obj_server.command('NEW 7 6 4').split()[1]
+        replies = [self.obj_server.command('MOVE {} {}'.format(session, column)) for column in '1212121']
+        self.assertEqual(replies, ['3'] * 6 + ['1'])
+
+    def test_error_ends_session(self):
+        """
+        An illegal move answers with its error code and ends the session
+        """
+        session = self.obj_server.command('NEW 7 6 4').split()[1]
+        self.assertEqual(self.obj_server.command('MOVE {} 8'.format(session)), '6')
+        self.assertEqual(self.obj_server.command('MOVE {} 1'.format(session)), 'ERR unknown')
+        session = self.obj_server.command('NEW 7 6 4').split()[1]
+        self.assertEqual(self.obj_server.command('MOVE {} x'.format(session)), '8')
+
+    def test_bad_commands(self):
+        """
+        Bad games, unknown commands and a full server
+        """
+        self.assertEqual(self.obj_server.command('NEW 3 3 4'), 'ERR 7')
+        self.assertEqual(self.obj_server.command('NEW 3 x'), 'ERR 8')
+        self.assertEqual(self.obj_server.command('JUMP 1'), 'ERR unknown')
+        self.assertEqual(self.obj_server.command(''), 'ERR unknown')
+        self.assertEqual(self.obj_server.command('END 99'), 'ERR unknown')
+        session = self.obj_server.command('NEW 7 6 4').split()[1]
+        self.obj_server.command('NEW 7 6 4')
+        self.assertEqual(self.obj_server.command('NEW 7 6 4'), 'ERR busy')
+        self.assertEqual(self.obj_server.command('STATS'), 'OK 2 0')
+        self.assertEqual(self.obj_server.command('END ' + session), 'OK')
+        self.assertEqual(self.obj_server.command('STATS'), 'OK 1 0')
+
+    def test_reap_idle(self):
+        """
+        Only sessions idle for longer than the timeout are dropped
+        """
+        idle = self.obj_server.command('NEW 7 6 4').split()[1]
+        self.clock.now = 8.0
+        active = self.obj_server.command('NEW 7 6 4').split()[1]
+        self.clock.now = 12.0
+        self.assertEqual(self.obj_server.reap_idle(), 1)
+        self.assertEqual(self.obj_server.command('MOVE {} 1'.format(idle)), 'ERR unknown')
+        self.assertEqual(self.obj_server.command('MOVE {} 1'.format(active)), '3')
+
+    def test_connection(self):
+        """
+        Commands over a socket are answered in order
+        """
+        async def talk(obj_server):
+            server = await obj_server.start('127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+            writer.write(b'NEW 7 6 4\nMOVE 1 1\nMOVE 1 9\nSTATS\n')
+            replies = [(await reader.readline()).decode().strip() for _ in range(4)]
+            writer.close()
+            while obj_server.connections:
+                await asyncio.sleep(0.01)
+            obj_server.stop()
+            server.close()
+            await server.wait_closed()
+            return replies
+
+        loop = asyncio.new_event_loop()
+        try:
+            replies = loop.run_until_complete(talk(GameServer()))
+        finally:
+            loop.close()
+        self.assertEqual(replies, ['OK 1', '3', '6', 'OK 0 1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
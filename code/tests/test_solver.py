@@ -0,0 +1,123 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(__file__) + '..')
+from connectz import Game
+from connectz import GameException
+from solver import Solver
+from solver import solve_parallel
+
+
+def minimax(conf, columns):
+    """
+    Value for the player to move by trying every game to the end on `Game`, 1 for a win, -1 for a loss and 0 for a draw
+    """
+    width, height = [int(value) for value in conf.split()[:2]]
+    values = []
+    for column in range(1, width + 1):
+        obj_game = Game(conf)
+        try:
+            for move_idx, move in enumerate(columns + [column]):
+                obj_game.move(move, move_idx % 2 + 1)
+        except GameException:
+            continue  # Column full
+        outcome = obj_game.get_outcome()
+        if outcome in (1, 2):
+            return 1  # Whoever just moved won
+        if outcome == 0 or len(columns) + 1 == width * height:
+            values.append(0)
+        else:
+            values.append(-minimax(conf, columns + [column]))
+    return max(values) if values else 0
+
+
+class TestSolver(unittest.TestCase):
+
+    def test_matches_minimax(self):
+        """
+        Solved values match trying every game, and the best column keeps the value
+        """
+        obj_random = random.Random(8)
+        for conf in ['3 3 3', '4 3 3', '3 4 3', '4 4 3', '5 2 2', '2 5 3']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            obj_solver = Solver(conf, table_bits=10)
+            for _ in range(12):
+                columns = []
+                for _ in range(obj_random.randint(max(0, width * height - 9), width * height - 1)):
+                    open_columns = [column for column in range(1, width + 1) if columns.count(column) < height]
+                    columns.append(obj_random.choice(open_columns))
+                    obj_game = Game(conf)
+                    for move_idx, move in enumerate(columns):
+                        obj_game.move(move, move_idx % 2 + 1)
+                    if obj_game.get_outcome() != 3:
+                        columns.pop()
+                        break
+                obj_solution = obj_solver.solve(columns)
+                self.assertTrue(obj_solution.b_exact)
+                self.assertEqual(obj_solution.value, minimax(conf, columns), (conf, columns))
+                after = obj_solver.solve(columns + [obj_solution.column])
+                if after.column is not None:
+                    self.assertEqual(-after.value, obj_solution.value, (conf, columns))
+
+    def test_options_agree(self):
+        """
+        The table and move ordering change the work done, not the answer
+        """
+        values = set()
+        for table_bits in (0, 12):
+            for centre_first in (True, False):
+                obj_solution = Solver('5 4 3', table_bits=table_bits, centre_first=centre_first).solve([3, 3])
+                values.add((obj_solution.value, obj_solution.score))
+        self.assertEqual(len(values), 1)
+
+    def test_parallel_matches_serial(self):
+        """
+        Splitting the root across processes gives the same value, score, column and depth as a serial solve
+        """
+        obj_random = random.Random(9)
+        for conf in ['4 4 3', '5 4 4', '6 4 4']:
+            width, height = [int(value) for value in conf.split()[:2]]
+            for _ in range(3):
+                columns = []
+                for _ in range(obj_random.randint(width * height - 12, width * height - 8)):
+                    open_columns = [column for column in range(1, width + 1) if columns.count(column) < height]
+                    columns.append(obj_random.choice(open_columns))
+                    obj_game = Game(conf)
+                    for move_idx, move in enumerate(columns):
+                        obj_game.move(move, move_idx % 2 + 1)
+                    if obj_game.get_outcome() != 3:
+                        columns.pop()
+                        break
+                serial = Solver(conf).solve(columns)
+                parallel = solve_parallel(conf, columns, workers=2)
+                self.assertEqual((parallel.value, parallel.score, parallel.column, parallel.depth),
+                                 (serial.value, serial.score, serial.column, serial.depth), (conf, columns))
+
+    def test_finished_and_illegal(self):
+        """
+        A won game has no best move, and illegal positions raise the usual error codes
+        """
+        obj_solution = Solver('7 6 4').solve([1, 2, 1, 2, 1, 2, 1])
+        self.assertIsNone(obj_solution.column)
+        self.assertEqual(obj_solution.value, -1)
+        with self.assertRaises(GameException) as context:
+            Solver('7 6 4').solve([8])
+        self.assertEqual(context.exception.code, 6)
+        with self.assertRaises(GameException) as context:
+            Solver('3 3 4')
+        self.assertEqual(context.exception.code, 7)
+
+    def test_depth_limit(self):
+        """
+        A search cut short by the depth isn't claimed as proven
+        """
+        obj_solution = Solver('7 6 4').solve([], max_depth=2)
+        self.assertEqual(obj_solution.depth, 2)
+        self.assertFalse(obj_solution.b_exact)
+        self.assertEqual(obj_solution.column, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()